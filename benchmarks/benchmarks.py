@@ -0,0 +1,239 @@
+from ktypes import types
+from ktypes._kstr import kstr
+from ktypes._kor import kor
+from ktypes._kmeta import kmeta
+from ktypes._kuniverse import kuniverse
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+benchmarks = []
+
+class colors:
+    GREEN = '\033[32m'
+    RED = '\033[31m'
+    YELLOW = "\033[33m"
+    END = '\033[0m'
+
+# registers a benchmark. a benchmark takes the number of [rows] and returns a
+# function which runs the benchmark once and returns the number of items 
+# processed. anything outside the returned function is setup and is not timed
+def benchmark(f):
+    benchmarks.append(f)
+    return f
+
+# times the fastest of [repeat] runs of [f] and then measures the peak memory
+# of one more run
+def measure(f, repeat):
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = f()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else 0.0,
+        "peak_bytes": peak,
+    }
+
+# runs the benchmarks named in [names] (or all) with [rows] rows, [repeat] 
+# times each, and returns a <dict> of results by benchmark name
+def run(rows, names=None, repeat=3):
+    results = {}
+    for bench in benchmarks:
+        if names and bench.__name__ not in names:
+            continue
+        result = measure(bench(rows), repeat)
+        results[bench.__name__] = result
+        print(f"{bench.__name__:<28} {result['items_per_second']:>14,.0f} items/s "
+            f"{result['peak_bytes'] / 1024:>12,.0f} KiB peak")
+
+    return results
+
+# saves [results] for [rows] as a json baseline at [path]
+def save(results, rows, path):
+    with open(path, "w") as f:
+        json.dump({
+            "rows": rows,
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "results": results,
+        }, f, indent=2)
+
+# compares [results] with the json baseline at [path], and returns the names
+# of benchmarks whose throughput dropped by more than [tolerance]
+def compare(results, path, tolerance=0.2):
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["items_per_second"]
+        after = result["items_per_second"]
+        change = (after - before) / before if before else 0.0
+        color = colors.RED if change < -tolerance else colors.GREEN
+        print(colors.YELLOW + f"{name:<28}" + color + f" {change:+.1%}" + colors.END)
+        if change < -tolerance:
+            regressions.append(name)
+
+    return regressions
+
+
+################################################################################
+# data
+types.bench_nan = types.str.where(lambda x: x == "--")
+types.bench_maybe_age = types.int | types.bench_nan
+types.bench_user = {
+    "id": types.int,
+    "first_name": types.str.where(ends_on=","),
+    "last_name": types.str.where(ends_on=","),
+    "email": types.str.where(ends_on=","),
+    "age": types.bench_maybe_age,
+    "ip_address": types.str.where(ends_on="\n")
+}
+bench_format = "$id$,$first_name$,$last_name$,$email$,$age$,$ip_address$"
+
+# returns [rows] records shaped like demo/demo_data.csv
+def generate_csv(rows, seed=0):
+    rng = random.Random(seed)
+    names = ["Brynne", "Mike", "Vladamir", "Kattie", "Leanor", "Clulow", "Robertson", "Essel"]
+    lines = []
+    for i in range(1, rows + 1):
+        first = rng.choice(names)
+        last = rng.choice(names)
+        age = rng.choice(["--", str(rng.randint(1, 99))])
+        ip = ".".join(str(rng.randint(0, 255)) for _ in range(4))
+        lines.append(f"{i},{first},{last},{first[0].lower()}{last.lower()}{i}@mail.com,{age},{ip}\n")
+    return "".join(lines)
+
+
+################################################################################
+# benchmarks
+@benchmark
+def parse_instance(rows):
+    parser = types.parser(types.bench_user, bench_format)
+    lines = generate_csv(rows).splitlines(keepends=True)
+
+    def f():
+        for line in lines:
+            parser.parse_instance(line)
+        return len(lines)
+
+    return f
+
+@benchmark
+def parse_stream(rows):
+    parser = types.parser(types.bench_user, bench_format)
+    data = generate_csv(rows)
+
+    def f():
+        return len(parser.parse_stream(data, reset=True))
+
+    return f
+
+@benchmark
+def parse_stream_regex(rows):
+    parser = types.parser(types.bench_user, bench_format, backend="regex")
+    data = generate_csv(rows)
+
+    def f():
+        return len(parser.parse_stream(data, reset=True))
+
+    return f
+
+@benchmark
+def iter_stream(rows):
+    parser = types.parser(types.bench_user, bench_format)
+    data = generate_csv(rows)
+
+    def f():
+        count = 0
+        for _ in parser.iter_stream([data]):
+            count = count + 1
+        return count
+
+    return f
+
+@benchmark
+def construct_int(rows):
+    raw = [str(i) for i in range(rows)]
+
+    def f():
+        for r in raw:
+            types.int(r)
+        return len(raw)
+
+    return f
+
+@benchmark
+def construct_str(rows):
+    raw = [f"value {i}" for i in range(rows)]
+
+    def f():
+        for r in raw:
+            types.str(r)
+        return len(raw)
+
+    return f
+
+@benchmark
+def construct_or(rows):
+    raw = [str(i) if i % 2 else "--" for i in range(rows)]
+
+    def f():
+        for r in raw:
+            types.bench_maybe_age(r)
+        return len(raw)
+
+    return f
+
+@benchmark
+def curried_call(rows):
+    @types.function
+    def add3(x : types.int, y : types.int, z : types.int) -> types.int:
+        return x + y + z
+
+    args = [types.int(i) for i in range(3)]
+
+    def f():
+        for _ in range(rows):
+            add3(*args)
+            add3(args[0])(args[1])(args[2])
+        return 2 * rows
+
+    return f
+
+@benchmark
+def universe_lookup(rows):
+    # a separate universe with [rows] registered function, coproduct and product
+    # types; lookups should not slow down as it grows
+    universe = kuniverse(index=f"bench_{rows}")
+    base = [kstr(universe) for _ in range(rows + 1)]
+    for i in range(rows):
+        universe.get_function([base[i], base[i + 1]])
+        universe.add_type("or", kor(universe, base[i], base[i + 1]), hash=i)
+        universe.add_type(f"meta_{i}", kmeta(universe, f"meta_{i}", {"a": base[i], "b": base[i + 1]}))
+
+    rng = random.Random(0)
+    probes = [rng.randrange(rows) for _ in range(1000)]
+
+    def f():
+        for i in probes:
+            universe.get_function([base[i], base[i + 1]])
+            universe.get_or(base[i + 1], base[i])
+            universe.get_meta([base[i], base[i + 1], None])
+        return 3 * len(probes)
+
+    return f
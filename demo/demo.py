@@ -39,8 +39,7 @@ parser = types.parser(types.site_user, format)
 
 tokens = None
 with open("demo/demo_data.csv") as f:
-    for line in f:
-        tokens = parser.parse_stream(line)
+    tokens = list(parser.iter_stream(f))
 
 for i in range(0, 5):
     print(tokens[i])
@@ -1,5 +1,9 @@
+import functools
+import itertools
+
 import ktypes._kor as _kor
 from ktypes._error import Error, ErrorHandler
+from ktypes._token import _Token
 
 # abstract class which is inherited by all types of the known type system. 
 # types are represented as instances of classes inheriting from <KType>
@@ -10,6 +14,21 @@ class KType():
     # [self.predicate_hash] hash value of the predicate function used to
     #       test for type equality between predicate types
     # [self.has_predicate] <True> if a predicate function is supplied
+    # [self.custom_predicate] the user supplied predicate given to 'where', if any
+    # [self.size_eq] the fixed size given to 'where', if any
+    # [self.ends_on] the terminating string given to 'where', if any
+    # [self.predicate_cache] the least-recently-used cache wrapping the predicate,
+    #       if predicate caching is enabled
+    # [self.interned] <dict> of shared tokens by value, if interning is enabled
+    # [self.interned_size] the maximum number of tokens in [self.interned]
+    # [self.id] stable <int> which identifies the type within this process
+    # [self.member_ids] <frozenset> of the ids of the members of a coproduct type,
+    #       empty for all other types (see 'kor')
+    #
+    # class attributes:
+    # [ids] counter giving the id of each new type
+
+    ids = itertools.count()
 
     # initialize a type, possibly with a boolean [predicate] function which
     # must be satisfied by tokens of the type
@@ -18,10 +37,26 @@ class KType():
         self.predicate = predicate
         self.predicate_hash = hash(predicate)
         self.has_predicate = True
+        self.custom_predicate = None
+        self.size_eq = None
+        self.ends_on = None
+        self.predicate_cache = None
+        self.interned = None
+        self.interned_size = 0
+        self.id = next(KType.ids)
+        self.member_ids = frozenset()
         if predicate is None:
             self.predicate = self._default_predicate
             self.has_predicate = False
 
+    # types are pickled as a reference to their id in their universe, as
+    # predicates are generally closures which cannot be pickled. the universe
+    # must exist in the unpickling process, e.g. in a forked worker
+    def __reduce__(self):
+        if self.universe is None or self.universe.types_by_id.get(self.id, None) is not self:
+            raise TypeError(f"cannot pickle type <{str(self)}> which is not in a universe")
+        return (type(self.universe).lookup, (self.universe.index, self.id))
+
     # constructs a token of this type. 
     def __call__(self, *args, **kwargs):
         return self.construct(*args, **kwargs)
@@ -56,11 +91,14 @@ class KType():
 
     # generate a new type resulting from applying a [predicate], a fixed size
     # equal to [size_eq], and/or termination on [ends_on] to an existing
-    # type. will return existing predicate type if found.
-    def where(self, predicate=None, size_eq=None, ends_on=None):
+    # type. will return existing predicate type if found. if [cache] is given,
+    # predicate results are cached for up to [cache] raw strings (see 
+    # 'cache_predicate')
+    def where(self, predicate=None, size_eq=None, ends_on=None, cache=None):
         if predicate is None and size_eq is None and ends_on is None:
             return self
         
+        custom_predicate = predicate
         predicates = []
         hashable_rep = []
         if predicate is not None:
@@ -81,18 +119,77 @@ class KType():
             predicate = predicates[0]
 
         klass = type(self)
-        pred_ktype = klass.instances.get(predicate_hash, None)
-        if pred_ktype is None:
-            pred_ktype = klass(self.universe, predicate=predicate)
-            klass.instances[predicate_hash] = pred_ktype
-            self.universe.add_type(str(self), pred_ktype, hash=predicate_hash)
+        with self.universe.lock:
+            pred_ktype = klass.instances.get(predicate_hash, None)
+            if pred_ktype is None:
+                pred_ktype = klass(self.universe, predicate=predicate)
+                pred_ktype.custom_predicate = custom_predicate
+                pred_ktype.size_eq = size_eq
+                pred_ktype.ends_on = ends_on
+                klass.instances[predicate_hash] = pred_ktype
+                self.universe.add_type(str(self), pred_ktype, hash=predicate_hash)
+
+        if cache is not None:
+            pred_ktype.cache_predicate(cache)
             
         return pred_ktype
 
+    # cache the results of the predicate for the [size] most recently used raw
+    # strings, so that repeated values are not validated again. predicates must
+    # not depend on anything but the raw string. replaces any existing cache
+    def cache_predicate(self, size=1024):
+        predicate = self.predicate
+        if self.predicate_cache is not None:
+            predicate = self.predicate_cache.__wrapped__
+
+        self.predicate_cache = functools.lru_cache(maxsize=size)(predicate)
+        self.predicate = self.predicate_cache
+        return self
+
+    # returns a <dict> of the hits, misses, current size and maximum size of the 
+    # predicate cache, or None if predicate caching is not enabled
+    def predicate_cache_info(self):
+        if self.predicate_cache is None:
+            return None
+
+        info = self.predicate_cache.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+        }
+
     # contruct a token of type <self>
     def construct(self, raw_data):
         pass
+
+    # share one token for each value constructed by this type, for up to [size]
+    # distinct values, so that repeated values do not allocate new tokens.
+    # shared tokens must not be mutated. interning is disabled if [size] is None
+    def intern_tokens(self, size=4096):
+        self.interned = None if size is None else {}
+        self.interned_size = size or 0
+        return self
+
+    # returns the shared token for [value] if interning is enabled, otherwise 
+    # a new token
+    def _token_for(self, value):
+        if self.interned is None:
+            return _Token(value, self)
+
+        token = self.interned.get(value, None)
+        if token is None:
+            token = _Token(value, self)
+            if len(self.interned) < self.interned_size:
+                self.interned[value] = token
+        return token
     
+    # returns False only if no raw data starting with the character [c] can
+    # match the type; used by <kor> to skip members which cannot match
+    def may_start(self, c):
+        return True
+
     # default predicate accepts all tokens
     def _default_predicate(self, arg):
         return True
@@ -106,13 +203,14 @@ class KType():
     # types [a] and [b]
     def __or__(a, b):
         universe = a.universe
-        existing_kor = universe.get_or(a, b)
+        with universe.lock:
+            existing_kor = universe.get_or(a, b)
 
-        if existing_kor is None:
-            existing_kor = _kor.kor(universe, a, b)
+            if existing_kor is None:
+                existing_kor = _kor.kor(universe, a, b)
 
-        universe.add_type("or", existing_kor, hash=hash(existing_kor))
-        return existing_kor
+            universe.add_type("or", existing_kor, hash=hash(existing_kor))
+            return existing_kor
 
     # returns a string representation of the type <self> 
     def __str__(self):
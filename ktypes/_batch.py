@@ -0,0 +1,143 @@
+from array import array
+
+from ktypes._kint import kint
+from ktypes._kstr import kstr
+from ktypes._kor import kor
+from ktypes._token import _Token
+
+# column of tokens of any type, stored as tokens. used for types which have no
+# compact representation
+class _token_column():
+    # instance attributes:
+    # [self.type] the type of all tokens in the column
+    # [self.values] <list> of the tokens in the column
+
+    def __init__(self, ktype):
+        self.type = ktype
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, token):
+        self.values.append(token)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+# column of <kint> tokens, stored as an <array> of 64-bit integers. falls back
+# to a <list> if a value does not fit
+class _int_column(_token_column):
+    def __init__(self, ktype):
+        super().__init__(ktype)
+        self.values = array("q")
+
+    def append(self, token):
+        try:
+            self.values.append(token.value)
+        except OverflowError:
+            self.values = list(self.values)
+            self.values.append(token.value)
+
+    def __getitem__(self, i):
+        return _Token(self.values[i], self.type)
+
+# column of <kstr> tokens, stored as one utf-8 encoded buffer and an <array> 
+# of offsets into the buffer, where token i is buffer[offsets[i]:offsets[i+1]]
+class _str_column(_token_column):
+    def __init__(self, ktype):
+        super().__init__(ktype)
+        self.buffer = bytearray()
+        self.offsets = array("q", [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, token):
+        self.buffer += token.value.encode("utf-8")
+        self.offsets.append(len(self.buffer))
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i+1]
+        return _Token(self.buffer[start:end].decode("utf-8"), self.type)
+
+# column of <kor> tokens, stored as an <array> of tags (0 for inl, 1 for inr), an
+# <array> of positions into the child column given by the tag, and a child 
+# column for each of the left and right types
+class _or_column(_token_column):
+    injections = ("inl", "inr")
+
+    def __init__(self, ktype):
+        super().__init__(ktype)
+        self.tags = array("b")
+        self.positions = array("q")
+        self.children = (_batch.column_for(ktype.left), _batch.column_for(ktype.right))
+
+    def __len__(self):
+        return len(self.tags)
+
+    def append(self, token):
+        inj, child_token = token.value
+        tag = self.injections.index(inj)
+        child = self.children[tag]
+        self.tags.append(tag)
+        self.positions.append(len(child))
+        child.append(child_token)
+
+    def __getitem__(self, i):
+        tag = self.tags[i]
+        child_token = self.children[tag][self.positions[i]]
+        return _Token((self.injections[tag], child_token), self.type)
+
+# columnar batch of tokens of a <kmeta> type, holding one column per attribute.
+# tokens are only materialized when indexed
+class _batch():
+    # instance attributes:
+    # [self.type] the <kmeta> type of the tokens in the batch
+    # [self.columns] <dict> of columns by attribute name
+    # [self.errors] <list> of errors given instead of tokens (see 'append')
+
+    def __init__(self, ktype):
+        self.type = ktype
+        self.columns = {key: _batch.column_for(field_type) for key, field_type in ktype.dict.items()}
+        self.errors = []
+
+    # returns an empty column to hold tokens of [ktype]
+    def column_for(ktype):
+        if isinstance(ktype, kint):
+            return _int_column(ktype)
+        if isinstance(ktype, kstr):
+            return _str_column(ktype)
+        if isinstance(ktype, kor):
+            return _or_column(ktype)
+        return _token_column(ktype)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    # append [token] of <self.type> to the batch. anything else, such as an error
+    # passed by the <ErrorHandler>, is kept in [self.errors]
+    def append(self, token):
+        if not isinstance(token, _Token) or token.type is not self.type:
+            self.errors.append(token)
+            return
+
+        for key, column in self.columns.items():
+            column.append(token.value[key])
+
+    # returns the column of tokens for attribute [name]
+    def column(self, name):
+        return self.columns[name]
+
+    # returns the token at index [i]
+    def __getitem__(self, i):
+        if i < 0:
+            i = i + len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("batch index out of range")
+
+        return _Token({key: column[i] for key, column in self.columns.items()}, self.type)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -40,6 +40,31 @@ class ErrorHandler():
     def raises(cls, err):
         raise err
 
+# collects the errors of a single parser call instead of passing them to the
+# <ErrorHandler>, so that invalid records are skipped and parsing continues.
+# counts every error but only keeps the first [sample_size] errors as samples
+class ErrorCollector():
+    # instance attributes
+    # [self.count] is the number of errors taken
+    # [self.samples] is a <list> of the first [self.sample_size] errors taken
+
+    def __init__(self, sample_size=10):
+        self.sample_size = sample_size
+        self.count = 0
+        self.samples = []
+
+    # takes a record of type [expected] which could not be parsed from the raw
+    # data [got]. the error is only created if it is sampled
+    def take_mismatch(self, expected, got):
+        self.count = self.count + 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append(Error.OfTypeMismatch(expected=expected, got=got))
+
+    # adds the count and samples of the [other] <ErrorCollector>
+    def merge(self, other):
+        self.count = self.count + other.count
+        self.samples.extend(other.samples[:self.sample_size - len(self.samples)])
+
 # functions as the namespace for all KTypes library errors
 class Error():
     # error OfTypeMismatch is thrown when a type is [expected] but a different type
@@ -108,4 +133,13 @@ class Error():
             self.msg = msg
 
         def __str__(self):
-            return f"<{str(self.msg)}> is not callable"
\ No newline at end of file
+            return f"<{str(self.msg)}> is not callable"
+
+    # error OfParseFailure is thrown when raw data does not follow the parse format
+    # of a parser, with [msg] describing the failure
+    class OfParseFailure(Exception):
+        def __init__(self, msg):
+            self.msg = msg
+
+        def __str__(self):
+            return f"failed to parse: {self.msg}"
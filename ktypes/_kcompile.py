@@ -0,0 +1,116 @@
+from ktypes._kint import kint
+from ktypes._kstr import kstr
+from ktypes._kor import kor
+from ktypes._token import _Token
+from ktypes._error import Error
+
+# the functions of a <kmeta> type generated as straight-line python source, with
+# the names and types of its attributes inlined, so that no loop over the
+# attributes, and no generic checks, are done per record (see 'kmeta.compile').
+# types are referenced by the generated code, not copied, so predicates which
+# are later cached, timed or interned still apply
+class _compiled_kmeta():
+    # instance attributes:
+    # [self.ktype] the <kmeta> type which is compiled
+    # [self.source] <str> of the generated python source, for inspection
+    # [self.construct] function equivalent to 'kmeta._try_construct', which
+    #       returns the token constructed from a <dict> of tokens by attribute
+    #       name and None, or None and the error
+    # [self.parse] function which takes a sequence of the raw data of each
+    #       attribute, in the order of 'kmeta.keys', and returns the token
+    #       constructed from the raw data and None, or None and the error. raw
+    #       data must match the attribute type, as with 'matches', and is then
+    #       constructed as with 'construct'
+
+    def __init__(self, ktype):
+        self.ktype = ktype
+        names = {"ktype": ktype, "_Token": _Token, "_new": object.__new__, "Error": Error}
+        for i, attribute_type in enumerate(ktype.signature):
+            names[f"t{i}"] = attribute_type
+
+        self.source = "\n".join([self._construct_source(), self._parse_source()])
+        exec(compile(self.source, f"<compiled {ktype}>", "exec"), names)
+        self.construct = names["construct"]
+        self.parse = names["parse"]
+
+    # returns lines which set [var] to a new token with [value] of [ktype],
+    # without the checks of '_Token.__init__'
+    def _new_token(var, value, ktype, is_meta=False):
+        return [
+            f"{var} = _new(_Token)",
+            f"{var}.value = {value}",
+            f"{var}.type = {ktype}",
+            f"{var}._is_meta = {is_meta}",
+            f"{var}._is_func = False",
+            f"{var}._is_or = False",
+        ]
+
+    # returns lines which fail with a type mismatch of attribute [i] on [got]
+    def _mismatch(i, got):
+        return [f"return None, Error.OfTypeMismatch(expected=t{i}, got={got})"]
+
+    # returns lines which check the token [var] of attribute [i] is of its type,
+    # and stores coproduct tokens as tokens of the attribute type
+    def _check_token(self, i, var):
+        lines = [f"if not isinstance({var}, _Token) or ({var}.type is not t{i} and not {var}.is_a(t{i})):"]
+        lines += ["    " + line for line in _compiled_kmeta._mismatch(i, var)]
+        if isinstance(self.ktype.signature[i], kor):
+            lines += [f"if {var}.type is not t{i}:", f"    {var} = t{i}.inject({var})"]
+        return lines
+
+    # returns the lines which construct the token of <self.ktype> from the
+    # attribute tokens [x0], [x1], ...
+    def _return_token(self):
+        fields = ", ".join(f"{key!r}: x{i}" for i, key in enumerate(self.ktype.keys))
+        lines = _compiled_kmeta._new_token("token", "{" + fields + "}", "ktype", is_meta=True)
+        return lines + ["return token, None"]
+
+    def _construct_source(self):
+        lines = [
+            "if not isinstance(raw_data, dict):",
+            "    return None, Error.OfArgument(expected_type=dict, got=raw_data)",
+            "get = raw_data.get",
+        ]
+        for i, key in enumerate(self.ktype.keys):
+            lines.append(f"x{i} = get({key!r})")
+            lines += self._check_token(i, f"x{i}")
+        lines += self._return_token()
+
+        return "def construct(raw_data):\n" + "\n".join("    " + line for line in lines) + "\n"
+
+    # returns lines which construct the token [x<i>] of attribute [i] from its
+    # raw data [v<i>], or fail if the raw data does not match
+    def _parse_attribute(self, i):
+        ktype = self.ktype.signature[i]
+        v, x = f"v{i}", f"x{i}"
+        mismatch = ["    " + line for line in _compiled_kmeta._mismatch(i, v)]
+
+        # kint and kstr are constructed without calling 'matches' and 'construct';
+        # predicates are only called if the type has one
+        if type(ktype) is kint:
+            lines = [f"if ' ' in {v}:"] + mismatch
+            lines += ["try:", f"    n = int({v})"]
+            lines += [f"    valid = t{i}.predicate({v})" if ktype.has_predicate else "    valid = True"]
+            lines += ["except Exception:", "    valid = False", "if not valid:"] + mismatch
+        elif type(ktype) is kstr:
+            lines = [f"n = str({v})"]
+            if ktype.has_predicate:
+                lines += [f"if not t{i}.predicate({v}):"] + mismatch
+        else:
+            lines = [f"if not t{i}.matches({v}):"] + mismatch
+            lines += [f"{x} = t{i}.construct({v})"]
+            return lines + self._check_token(i, x)
+
+        lines += [f"if t{i}.interned is None:"]
+        lines += ["    " + line for line in _compiled_kmeta._new_token(x, "n", f"t{i}")]
+        lines += ["else:", f"    {x} = t{i}._token_for(n)"]
+        return lines
+
+    def _parse_source(self):
+        variables = "".join(f"v{i}, " for i in range(len(self.ktype.signature)))
+        lines = [f"{variables}= values"] if variables else []
+        for i in range(len(self.ktype.signature)):
+            lines += self._parse_attribute(i)
+        lines += self._return_token()
+
+        return "def parse(values):\n" + "\n".join("    " + line for line in lines) + "\n"
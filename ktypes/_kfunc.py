@@ -1,6 +1,16 @@
+from array import array
+
 from ktypes._abstract_type import KType
 from ktypes._token import _Token
 from ktypes._error import Error, ErrorHandler
+from ktypes._batch import _batch, _int_column
+from ktypes._kint import kint
+
+# numpy is optional, and only used to vectorize 'map_batch' over <kint> columns
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # represents a function/curried-function for multiple arguments. this is the formal
 # KTypes representatio nof a function, and is a formal type in the KTypes universe
@@ -49,13 +59,29 @@ class _function_wrapper():
     # [self.func] is the python method which defines the formally typed function
     # [self.args] is a <list> of the arguments already curried into the typed function
     # [self.kwargs] is a <dict> of the named arguments given to the function
+    # [self.curry_chain] is a <list> of the types of [self.func] after currying
+    #       each number of arguments, computed once when the function is wrapped
+    #       and shared by all curried functions. the last entry is the return type
 
-    def __init__(self, func, ktype, args=[], kwargs={}):
+    def __init__(self, func, ktype, args=[], kwargs={}, curry_chain=None):
         super().__init__()
         self.ktype = ktype
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.curry_chain = curry_chain
+        if curry_chain is None:
+            self.curry_chain = _function_wrapper._curry_chain(ktype)
+
+    # returns the types of a function of [ktype] after currying each number of
+    # arguments
+    def _curry_chain(ktype):
+        signature = ktype.signature
+        chain = [ktype]
+        for i in range(1, len(signature) - 1):
+            chain.append(ktype.universe.get_function(signature[i:]))
+        chain.append(signature[-1])
+        return chain
 
     # ensure that the [arg] provided to the function <self> is a token of [ktype]
     def _typecheck(self, arg, ktype):
@@ -65,28 +91,25 @@ class _function_wrapper():
         
         return True
 
-    # get the type of the function returned after currying the next argument 
-    # of a function of type [old_ktype]
-    def _get_type_after_currying(self, old_ktype):
-        signature = old_ktype.signature[1:]
-        if len(signature) == 1:
-            return signature[0] 
-        else:
-            return self.ktype.universe.get_function(signature)
-
-    # curry [arg] and returns a new function (token of function type) of the proper
-    # type after currying one argument. ensure that [arg] is the proper type
-    def _curry(self, arg):
-        _, required_type = list(self.func.__annotations__.items())[len(self.args)]
-        self._typecheck(arg, required_type)
-        curried_type = self._get_type_after_currying(self.ktype)
-        if isinstance(curried_type, kfunc):
-            curried_func = _function_wrapper(self.func, curried_type, args=self.args+[arg], kwargs=self.kwargs)
+    # curry [args], which must not exceed the remaining arguments, and return a
+    # new function (token of function type) of the proper type after currying,
+    # or the result of the python method if all arguments are given. ensure
+    # that each of [args] is the proper type
+    def _curry(self, args):
+        signature = self.curry_chain[0].signature
+        for i, arg in enumerate(args, len(self.args)):
+            self._typecheck(arg, signature[i])
+
+        args = self.args + list(args)
+        if len(args) < len(self.curry_chain) - 1:
+            curried_type = self.curry_chain[len(args)]
+            curried_func = _function_wrapper(self.func, curried_type, args=args, 
+                kwargs=self.kwargs, curry_chain=self.curry_chain)
             return _Token(curried_func, curried_type, is_func=True)
-        else:
-            result = self.func(*(self.args + [arg]), **self.kwargs)
-            self._typecheck(result, self.func.__annotations__.get("return", None))
-            return result
+
+        result = self.func(*args, **self.kwargs)
+        self._typecheck(result, self.func.__annotations__.get("return", None))
+        return result
 
     # providing a [universe], returns a function which wraps a python method (func)
     # into a KTypes function token.
@@ -100,14 +123,83 @@ class _function_wrapper():
 
     # allow a _function_wrapper to be called and curries the arguments given. 
     # returns either a curried function, or the value of evaluating the pyhton 
-    # method
+    # method. arguments beyond those of the python method are applied to the
+    # returned value
     def __call__(self, *args, **kwargs):
-        curried_func = self
-        if args or kwargs:
-            for arg in args:
-                curried_func = curried_func._curry(arg)
-
-        return curried_func
+        if not args:
+            return self
+
+        remaining = len(self.curry_chain) - 1 - len(self.args)
+        result = self._curry(args[:remaining])
+        if len(args) > remaining:
+            return result(*args[remaining:])
+        return result
+
+    # apply the function to each row of [columns], which are columns or batches
+    # of equal length supplying the remaining arguments in order, and return a 
+    # column of the results. each column is typechecked once against its 
+    # argument type, rather than per row.
+    #
+    # if [vectorize] is True, numpy is available, and all arguments and the
+    # return value are <kint>, the python method is called once with tokens
+    # holding numpy arrays, so <kint> arithmetic runs as numpy operations. note 
+    # that numpy integers are 64-bit and wrap on overflow. if the python method
+    # does not return a <kint> token of integer arrays, e.g. because it branches
+    # on token values, the rows are applied one at a time instead
+    def map_batch(self, *columns, vectorize=False):
+        signature = self.curry_chain[0].signature
+        if len(self.args) + len(columns) != len(self.curry_chain) - 1:
+            return ErrorHandler.take(Error.OfArgument(
+                expected_type=f"{len(self.curry_chain) - 1 - len(self.args)} columns", got=columns))
+
+        for i, column in enumerate(columns, len(self.args)):
+            if column.type != signature[i]:
+                ErrorHandler.raises(Error.OfTypeMismatch(expected=signature[i], got=column.type))
+
+        size = len(columns[0]) if columns else 0
+        for column in columns:
+            if len(column) != size:
+                return ErrorHandler.take(Error.OfArgument(expected_type=f"columns of length {size}", got=column))
+
+        return_type = self.func.__annotations__.get("return", None)
+        if vectorize:
+            result = self._map_vectorized(columns, size, return_type)
+            if result is not None:
+                return result
+
+        result = _batch.column_for(return_type)
+        for i in range(size):
+            value = self.func(*self.args, *[column[i] for column in columns], **self.kwargs)
+            self._typecheck(value, return_type)
+            result.append(value)
+
+        return result
+
+    # applies the function to <kint> [columns] as numpy arrays (see 'map_batch'),
+    # returning None if this is not possible
+    def _map_vectorized(self, columns, size, return_type):
+        if numpy is None or size == 0 or not isinstance(return_type, kint):
+            return None
+
+        tokens = []
+        for column in columns:
+            if not isinstance(column, _int_column) or not isinstance(column.values, array):
+                return None
+            tokens.append(_Token(numpy.frombuffer(column.values, dtype=numpy.int64), column.type))
+
+        try:
+            value = self.func(*self.args, *tokens, **self.kwargs)
+        except Exception:
+            return None
+
+        if (not isinstance(value, _Token) or value.type != return_type
+                or not isinstance(value.value, numpy.ndarray)
+                or value.value.shape != (size,) or value.value.dtype.kind != "i"):
+            return None
+
+        result = _int_column(return_type)
+        result.values.frombytes(value.value.astype(numpy.int64).tobytes())
+        return result
 
     # syntactic sugar which allows two tokens of a function type to be or-ed
     # together to create a function from an or-type. 
@@ -127,12 +219,31 @@ class _function_wrapper():
         if a_domain_type == b_domain_type:
             return ErrorHandler.take(Error.OfOrConstructorFailure("cannot 'or' functions defined over the same domain"))
 
-        @_function_wrapper.wrap(a.ktype.universe)
-        def klambda(x : a_domain_type | b_domain_type) -> a_returns:
-            inj, token = x.value
-            if(token.is_a(a_domain_type)):
-                return a(token)
-            else:
-                return b(token)
+        # the function and domain to call for the type of the value of each
+        # token, by type id. tables of or-ed functions are merged so that 
+        # functions or-ed many times still dispatch in one step
+        dispatch = _function_wrapper._dispatch_table(b, b_domain_type)
+        dispatch.update(_function_wrapper._dispatch_table(a, a_domain_type))
 
-        return klambda
+        def klambda(x : a_domain_type | b_domain_type) -> a_returns:
+            _, token = x.value
+            while token._is_or:
+                _, token = token.value
+
+            func, domain_type = dispatch[token.type.id]
+            if token.type is not domain_type:
+                token = domain_type.inject(token)
+            return func(token)
+
+        klambda.dispatch = dispatch
+        return _function_wrapper.wrap(a.ktype.universe)(klambda)
+
+    # returns a <dict> of the (function, domain type) to call for tokens of each 
+    # type by id, for the function [func] with [domain_type]
+    def _dispatch_table(func, domain_type):
+        dispatch = getattr(func.func, "dispatch", None)
+        if dispatch is not None:
+            return dict(dispatch)
+
+        ids = domain_type.member_ids or [domain_type.id]
+        return {type_id: (func, domain_type) for type_id in ids}
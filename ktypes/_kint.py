@@ -24,7 +24,7 @@ class kint(KType):
     # TODO: allow raw_data to be other formats than string
     # construct an instance of <kint> from [raw_data]
     def construct(self, raw_data):
-        return _Token(int(raw_data), self)
+        return self._token_for(int(raw_data))
 
     # returns True if [raw_data] type matches <self>
     def matches(self, raw_data):
@@ -37,6 +37,10 @@ class kint(KType):
         except Exception:
             return False
 
+    # int() only accepts strings starting with whitespace, a sign or a digit
+    def may_start(self, c):
+        return c.isdecimal() or c.isspace() or c in "+-"
+
     # assumes both [token1] and [token2] are tokens of <self> type
     # returns the addition product both
     def add(self, token1, token2):
@@ -1,6 +1,8 @@
+
 from ktypes._abstract_type import KType
 from ktypes._token import _Token
 from ktypes._error import Error, ErrorHandler
+from ktypes._kcompile import _compiled_kmeta
 
 # represents a n-product type from n components given by a dict. retains the order
 # of each component, which is used when defining functions out of the n-product type
@@ -17,6 +19,8 @@ class kmeta(KType):
     #       responds to
     # [self.signature] is the ordered <list> of types which uniquely defines the 
     #       type of the kmeta object
+    # [self.compiled] the <_compiled_kmeta> functions generated for <self> by
+    #       'compile', or None
     
     instances = {}
 
@@ -26,6 +30,7 @@ class kmeta(KType):
         self.dict = data
         self.keys = data.keys()
         self.signature = list(data.values())
+        self.compiled = None
 
     # TODO: formailze this method for kmeta objects
     # returns true if [raw_data] matches the kmeta object <self>.
@@ -38,16 +43,161 @@ class kmeta(KType):
     # <self>. raises an error if these named attributes do not coincide, or if the 
     # component types provided do not satisfy the typechecker
     def construct(self, raw_data):
+        token, err = self._try_construct(raw_data)
+        if err is not None:
+            return ErrorHandler.take(err)
+
+        return token
+
+    # generates python source for constructing tokens of <self> which inlines
+    # the names and types of its attributes (see '_compiled_kmeta'), and uses it
+    # for all tokens constructed from then on, including by parsers. the 
+    # functions are generated once and kept on the type. returns <self>
+    def compile(self):
+        with self.universe.lock:
+            if self.compiled is None:
+                self.compiled = _compiled_kmeta(self)
+        return self
+
+    # returns the n-product type of the named attributes [fields] of <self>, in
+    # the order given by [fields]. the same projection is returned each time.
+    # projections are registered under a key which includes the field names, so
+    # other products with the same signature are not replaced
+    def project(self, fields):
+        data = {key: self.dict[key] for key in fields}
+        name = " & ".join(map(str, data.values()))
+        projection_hash = (hash(tuple(data.values())), tuple(data))
+
+        with self.universe.lock:
+            existing = self.universe.types.get(name + str(projection_hash), None)
+            if isinstance(existing, kmeta) and existing.dict == data:
+                return existing
+
+            ktype = kmeta(self.universe, name, data)
+            self.universe.add_type(name, ktype, hash=projection_hash)
+            return ktype
+
+    # construct a token of <self> from [raw_data], a <dict> of the raw data of
+    # each named attribute as a (source, start, end) slice. attributes are only
+    # constructed and typechecked when first accessed (see '_lazy_record')
+    def construct_lazy(self, raw_data):
+        return _Token(_lazy_record(self, raw_data), self)
+
+    # returns the token of <self> constructed from [raw_data] and None, or None
+    # and the error which 'construct' would take
+    def _try_construct(self, raw_data):
+        if self.compiled is not None:
+            return self.compiled.construct(raw_data)
+
         token_dict = {}
 
         if isinstance(raw_data, dict):
             for key in self.keys:
+                # raw values which are not tokens, e.g. from json, do not match
                 data = raw_data.get(key, None)
-                if data is not None and data.is_a(self.dict[key]):
-                    token_dict[key] = raw_data[key]
+                if isinstance(data, _Token) and data.is_a(self.dict[key]):
+                    # coproduct tokens are stored as tokens of the attribute type
+                    if data.type is not self.dict[key]:
+                        data = self.dict[key].inject(data)
+                    token_dict[key] = data
                 else:
-                    return ErrorHandler.take(Error.OfTypeMismatch(expected=self.dict[key], got=data))
+                    return None, Error.OfTypeMismatch(expected=self.dict[key], got=data)
+        else:
+            return None, Error.OfArgument(expected_type=type({}), got=raw_data)
+
+        return _Token(token_dict, self), None
+
+    # construct tokens of <self> from each record in [records] as with 
+    # 'construct'. records are split into chunks of [chunk_size] which are 
+    # constructed by [executor], a <concurrent.futures.Executor>, if given,
+    # otherwise in this thread. invalid records do not go to the <ErrorHandler>;
+    # returns the <list> of tokens of the valid records, in order, and a <list>
+    # of (index, error) pairs for the invalid records. types are pickled by
+    # reference to their universe, so a process pool must be created with a 
+    # 'fork' context by the caller, so its workers have the types defined 
+    # before the first chunk is sent; this is not checked
+    def construct_many(self, records, executor=None, chunk_size=1024):
+        records = list(records)
+        starts = range(0, len(records), chunk_size)
+        chunks = [records[start:start+chunk_size] for start in starts]
+
+        if executor is None:
+            results = map(self._construct_chunk, chunks, starts)
         else:
-            return ErrorHandler.take(Error.OfArgument(expected_type=type({}), got=raw_data))
+            results = executor.map(self._construct_chunk, chunks, starts)
+
+        tokens = []
+        failures = []
+        for chunk_tokens, chunk_failures in results:
+            tokens.extend(chunk_tokens)
+            failures.extend(chunk_failures)
+        return tokens, failures
+
+    # constructs the [records] of one chunk of 'construct_many', where the 
+    # first record has index [start]
+    def _construct_chunk(self, records, start):
+        tokens = []
+        failures = []
+        for i, record in enumerate(records):
+            token, err = self._try_construct(record)
+            if err is None:
+                tokens.append(token)
+            else:
+                failures.append((start + i, err))
+        return tokens, failures
+
+
+# the <dict> value of a lazily constructed <kmeta> token. holds the raw data of 
+# each attribute as a (source, start, end) slice until the attribute is first 
+# accessed, when its token is constructed and stored in place of the slice. 
+# the source of an attribute is kept alive until the attribute is constructed
+class _lazy_record(dict):
+    # instance attributes:
+    # [self.ktype] the <kmeta> type of the record
+    __slots__ = ("ktype",)
+
+    # [raw_data] is a <dict> of slices by attribute name, which must contain 
+    # every attribute of [ktype]
+    def __init__(self, ktype, raw_data):
+        super().__init__((key, raw_data[key]) for key in ktype.keys)
+        self.ktype = ktype
+
+    # returns the token of the attribute [key], constructing it if needed. 
+    # slices are the only <tuple> values, as attributes are always tokens
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is tuple:
+            source, start, end = value
+            ktype = self.ktype.dict[key]
+            value = ktype.construct(source[start:end])
+            if not isinstance(value, _Token) or not value.is_a(ktype):
+                return ErrorHandler.take(Error.OfTypeMismatch(expected=ktype, got=source[start:end]))
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
-        return _Token(token_dict, self)
+    # records are pickled with all attributes constructed, as plain dicts
+    def __reduce__(self):
+        return (dict, (self.items(),))
@@ -1,8 +1,21 @@
 from ktypes._abstract_type import KType
 from ktypes._token import _Token
+from ktypes._error import Error, ErrorHandler
 
 # represents a coproduct (or) type from two component types 
 class kor(KType):
+    # instance attributes
+    # [self.members] <frozenset> of the component types, with nested <kor> types
+    #       flattened; two coproducts are the same type if their members are equal
+    # [self.member_ids] <frozenset> of the ids of [self.members], so tokens are
+    #       checked against the coproduct with a single lookup (see '_Token.is_a')
+    # [self.alternatives] <list> of (member, path) for each member in the order
+    #       it is tried by 'construct', where path is the <list> of (injection,
+    #       coproduct) which wrap a token of the member, outermost first
+    # [self.paths] <dict> of the path of each member by id
+    # [self.candidates] <dict> of the alternatives which may match raw data
+    #       starting with a given character (see 'KType.may_start')
+
     instances = {}
 
     def __init__(self, universe, left, right, predicate=None):
@@ -10,28 +23,77 @@ class kor(KType):
         self.name = str(left) + " | " + str(right) 
         self.left = left
         self.right = right
+        self.members = kor.flatten(left) | kor.flatten(right)
+        self.member_ids = frozenset(member.id for member in self.members)
+        self.alternatives = kor._alternatives(self)
+        self.paths = {}
+        for member, path in self.alternatives:
+            self.paths.setdefault(member.id, path)
+        self.candidates = {}
+
+    # returns the <frozenset> of non-coproduct types which make up [ktype]
+    def flatten(ktype):
+        if isinstance(ktype, kor):
+            return ktype.members
+        return frozenset([ktype])
+
+    # returns the (member, path) alternatives of [ktype], flattening nested
+    # coproducts with the left component first
+    def _alternatives(ktype):
+        if not isinstance(ktype, kor):
+            return [(ktype, [])]
+
+        alternatives = []
+        for inj, component in (("inl", ktype.left), ("inr", ktype.right)):
+            for member, path in kor._alternatives(component):
+                alternatives.append((member, [(inj, ktype)] + path))
+        return alternatives
+
+    # returns the alternatives which may match [raw_data], looked up by its
+    # first character
+    def _candidates_for(self, raw_data):
+        if not isinstance(raw_data, str) or not raw_data:
+            return self.alternatives
+
+        c = raw_data[0]
+        candidates = self.candidates.get(c, None)
+        if candidates is None:
+            candidates = [(member, path) for member, path in self.alternatives if member.may_start(c)]
+            self.candidates[c] = candidates
+        return candidates
+
+    # wraps [token] in the injections of [path]
+    def _wrap(token, path):
+        for inj, ktype in reversed(path):
+            token = _Token((inj, token), ktype)
+        return token
 
     def where(self, predicate):
         self.predicate = predicate
         return self
 
     def matches(self, raw_data):
-        return self.left.matches(raw_data) or self.right.matches(raw_data)
+        for member, _ in self._candidates_for(raw_data):
+            if member.matches(raw_data):
+                return True
+        return False
 
     def construct(self, raw_data):
         if isinstance(raw_data, _Token):
-            if raw_data.is_a(self.left):
-                return self._inl(raw_data)
-            elif raw_data.is_a(self.right):
-                return self._inr(raw_data)
+            return self.inject(raw_data)
                 
-        if self.left.matches(raw_data):
-            return self._inl(self.left.construct(raw_data))
-        elif self.right.matches(raw_data):
-            return self._inr(self.right.construct(raw_data))
+        for member, path in self._candidates_for(raw_data):
+            if member.matches(raw_data):
+                return kor._wrap(member.construct(raw_data), path)
 
-    def _inl(self, token):
-        return _Token(("inl", token), self)
+    # returns the token of <self> which holds the value of [token], a token of 
+    # any member of <self> or of another coproduct, injected along the left and
+    # right components of <self>
+    def inject(self, token):
+        while token._is_or:
+            _, token = token.value
 
-    def _inr(self, token):
-        return _Token(("inr", token), self)
+        path = self.paths.get(token.type.id, None)
+        if path is None:
+            return ErrorHandler.take(Error.OfTypeMismatch(expected=self, got=token))
+        return kor._wrap(token, path)
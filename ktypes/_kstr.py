@@ -27,7 +27,7 @@ class kstr(KType):
         return self.predicate(raw_data)
 
     def construct(self, raw_data):
-        return _Token(str(raw_data), self)
+        return self._token_for(str(raw_data))
 
     def add(self, token1, token2):
         return _Token(token1.value + token2.value, self)
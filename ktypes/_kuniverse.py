@@ -1,16 +1,59 @@
+import threading
+
 from ktypes._abstract_type import KType
 from ktypes._kint import kint
 from ktypes._kstr import kstr
 from ktypes._kfunc import kfunc
 from ktypes._kor import kor
 from ktypes._kmeta import kmeta
+from ktypes._profile import _profile
 
 class kuniverse(KType):
+    # class attributes:
+    # [universes] <dict> of all universes by index, used to resolve pickled
+    #       references to types
+
+    #
+    # instance attributes:
+    # [self.types] <dict> of all types in the universe by key. keys are not
+    #       unique; a later type added under the same key replaces the earlier
+    # [self.types_by_id] <dict> of all types in the universe by 'KType.id', used to 
+    #       resolve pickled references to types
+    # [self.functions] <dict> index of <kfunc> types by signature <tuple>
+    # [self.ors] <dict> index of <kor> types by their flattened members
+    # [self.metas] <dict> index of <kmeta> types by signature <tuple>
+    #       each index maps a canonical key to a <dict> of the types with that
+    #       key by their key in [self.types], in the order they were added
+    # [self.lock] reentrant lock held while types are registered, so types can 
+    #       be defined from multiple threads
+
+    universes = {}
+
     def __init__(self, index):
         super().__init__(None)
         self.index = index
         self.name = f"Univ_{index}"
-        self.types = {"int": kint(self), "str": kstr(self)}
+        self.types = {}
+        self.types_by_id = {}
+        self.functions = {}
+        self.ors = {}
+        self.metas = {}
+        self.lock = threading.RLock()
+        self.add_type("int", kint(self))
+        self.add_type("str", kstr(self))
+        kuniverse.universes[index] = self
+
+    # returns the type with [id] in the universe with [index], or the universe
+    # itself if [id] is None
+    @classmethod
+    def lookup(cls, index, id):
+        universe = cls.universes[index]
+        if id is None:
+            return universe
+        return universe.types_by_id[id]
+
+    def __reduce__(self):
+        return (kuniverse.lookup, (self.index, None))
 
     def where(self, predicate):
         return self
@@ -22,43 +65,61 @@ class kuniverse(KType):
         return self
 
     def add_type(self, name, ktype, hash=""):
-        self.types[name + str(hash)] = ktype
+        key = name + str(hash)
+        with self.lock:
+            replaced = self.types.get(key, None)
+            self.types[key] = ktype
+            self.types_by_id[ktype.id] = ktype
+
+            # index by canonical key. a type which replaces another under the 
+            # same key also replaces it in the index, so lookups return the 
+            # first type in [self.types] which matches
+            if replaced is not None and self._index(replaced) != self._index(ktype):
+                index, canonical = self._index(replaced)
+                if index is not None:
+                    del index[canonical][key]
+                    if not index[canonical]:
+                        del index[canonical]
+
+            index, canonical = self._index(ktype)
+            if index is not None:
+                index.setdefault(canonical, {})[key] = ktype
+
+            if _profile.enabled:
+                _profile.instrument(ktype)
+
+    # returns the index of [ktype] and its canonical key in the index, or None
+    # and None if types like [ktype] are not indexed
+    def _index(self, ktype):
+        if isinstance(ktype, kfunc):
+            return self.functions, tuple(ktype.signature)
+        elif isinstance(ktype, kor):
+            return self.ors, ktype.members
+        elif isinstance(ktype, kmeta):
+            return self.metas, tuple(ktype.signature)
+        return None, None
+
+    # returns the first type in [index] with [canonical] key, or None
+    def _first(index, canonical):
+        for ktype in index.get(canonical, {}).values():
+            return ktype
+        return None
 
     def get_function(self, signature):
-        for name, ktype in self.types.items():
-            if isinstance(ktype, kfunc) and ktype.signature == signature:
-                return ktype
-        func = kfunc(self, signature)
-        self.add_type(func.name, func)
+        with self.lock:
+            func = kuniverse._first(self.functions, tuple(signature))
+            if func is not None:
+                return func
+
+            func = kfunc(self, signature)
+            self.add_type(func.name, func)
 
-        return func
+            return func
 
     def get_meta(self, signature):
-        for name, ktype in self.types.items():
-            if isinstance(ktype, kmeta) and ktype.signature == signature[:-1]:
-                return ktype
-        
         # TODO: handle case where kmeta does not exist
-        return None            
-
-    def _add_type_to_dict(self, ktype, d):
-        if isinstance(ktype, kor):
-            self._add_type_to_dict(ktype.left, d)
-            self._add_type_to_dict(ktype.right, d)
-        else:
-            d[ktype] = 1
+        return kuniverse._first(self.metas, tuple(signature[:-1]))
 
     def get_or(self, a, b):
-        or_dict = {}
-        self._add_type_to_dict(a, or_dict)
-        self._add_type_to_dict(b, or_dict)
-
-        for name, ktype in self.types.items():
-            if isinstance(ktype, kor):
-                candidate_or_dict = {}
-                self._add_type_to_dict(ktype, candidate_or_dict)
-                if candidate_or_dict == or_dict:
-                    return ktype
-
         # TODO: handle case where kor does not exist
-        return None
+        return kuniverse._first(self.ors, kor.flatten(a) | kor.flatten(b))
@@ -1,13 +1,92 @@
+import codecs
+import concurrent.futures
+import csv
+import itertools
+import mmap
+import multiprocessing
+import re
+import threading
+
+from ktypes._kint import kint
+from ktypes._kstr import kstr
+from ktypes._error import Error, ErrorHandler, ErrorCollector
+from ktypes._batch import _batch
+from ktypes._profile import _profile
+
+# signed run of decimal digits; the longest prefix which <kint> can greedily match
+# when no whitespace is involved
+_int_run = re.compile(r"[+-]?\d+")
+_bytes_int_run = re.compile(rb"[+-]?[0-9]+")
+
+# a field of an unconstrained <kint> which the greedy matcher ends right before
+# a delimiter that is not whitespace. the newline is carried by the first field
+# of records which start with the terminator of the previous record
+_csv_int = re.compile(r"\n?[+-]?\d+")
+
 class _parser():
-    def __init__(self, ktype, parse_format):
+    # instance attributes:
+    # [self.parse_fragments] <list> of literal <str> delimiters and (name, ktype)
+    #       fields, in the order given by the parse format
+    # [self.parse_plan] <list> parallel to [self.parse_fragments] which holds, for
+    #       each field, a scanner used to find the end of the field in one step,
+    #       or None if the field must be matched character by character
+    # [self.backend] is a <str> which takes the value
+    #       "plan": fields are matched one at a time using [self.parse_plan]
+    #       "regex": runs of fragments are matched together by compiled regular
+    #           expressions stored in [self.parse_segments]
+    # [self.parse_segments] <list> parallel to [self.parse_fragments] which holds
+    #       a <_regex_segment> at the index where each segment starts, or None
+    #       when the "plan" backend is used
+    # [self.ktype] the <kmeta> type of parsed tokens, which is projected onto
+    #       the requested fields if only some fields are parsed
+    # [self.lazy] True if fields are only constructed when first accessed; 
+    #       records then hold the raw text of their fields (see '_lazy_record')
+    # [self.csv_plan] (delimiter, consumed, fields, order) if the parse format is a
+    #       plain delimited format, which is parsed line by line with the 
+    #       <csv> reader (see '_compile_csv_plan'), or None if it is not, or if
+    #       the parser is created with csv=False
+    # [self.bytes_plans] <dict> by encoding of the plans used by 'parse_bytes'
+    # [self.stream] the <_stream> used by 'parse_stream'
+    # [self.stream_lock] lock held by 'parse_stream'. all other parse methods 
+    #       create a parse context for each call, so a parser can be shared 
+    #       between threads
+
+    # class attributes:
+    # [forked_parsers] <dict> of parsers used by a running 'parse_file' with
+    #       forked workers, by a key unique to each call. parsers hold closures
+    #       and cannot be pickled, so workers are forked and find their parser
+    #       here
+    # [forked_keys] counter giving the key of each call in [forked_parsers]
+
+    recognized_backends = [
+        "plan",
+        "regex",
+    ]
+    forked_parsers = {}
+    forked_keys = itertools.count()
+
+    def __init__(self, ktype, parse_format, backend="plan", lazy=False, fields=None, csv=True):
         # TODO: check proper types here
+        if backend not in self.recognized_backends:
+            raise Exception("unsupported parser backend")
 
         self.ktype = ktype
         self.parse_format = parse_format
+        self.backend = backend
+        self.lazy = lazy
         self._unpack_parse_format()
+        if fields is not None:
+            self._project_fragments(fields)
+            self.ktype = ktype.project(fields)
+        self._compile_parse_plan()
+        self.csv_plan = self._compile_csv_plan() if csv else None
+        self.parse_segments = None
+        if backend == "regex":
+            self._compile_parse_segments()
+        self.bytes_plans = {}
 
-        self.stream_context = None
-        self.stream_tokens = []
+        self.stream = None
+        self.stream_lock = threading.RLock()
 
     class _unpack_state():
         BASE = 0
@@ -47,9 +126,316 @@ class _parser():
 
         self.parse_fragments = fragments
 
+    # stands in for the type of a field which is not in the projection given to
+    # the parser. the field is skipped up to the first character [end] of the
+    # delimiter which follows it, and is never constructed
+    class _skipped_field():
+        def __init__(self, end):
+            self.end = end
+
+        def matches(self, raw_data):
+            return self.end not in raw_data
+
+        def construct(self, raw_data):
+            return None
+
+    # replaces the type of each field which is not in [fields], and is followed
+    # by a delimiter, with a <_skipped_field>. other fields are still matched by
+    # their type, but are left out of the projected tokens
+    def _project_fragments(self, fields):
+        names = [fragment[0] for fragment in self.parse_fragments if not isinstance(fragment, str)]
+        for name in fields:
+            if name not in names:
+                raise Exception("unknown type keyword")
+
+        fragments = self.parse_fragments
+        for i, fragment in enumerate(fragments[:-1]):
+            if isinstance(fragment, str) or fragment[0] in fields:
+                continue
+            if isinstance(fragments[i+1], str):
+                fragments[i] = (fragment[0], self._skipped_field(fragments[i+1][0]))
+
+    # a scanner takes the [text] being parsed and the [pos] at which a field
+    # starts, and returns the index at which the greedy, first-failure-stop
+    # matcher would end the field, or None if this cannot be decided without
+    # falling back to the character matcher. scanners must agree exactly with
+    # the character matcher whenever they return an index.
+
+    # fields of an unconstrained <kstr> match everything, and so consume the
+    # remaining text
+    def _scan_str(text, pos):
+        return len(text)
+
+    # fields of an unconstrained <kint> end after the run of digits, unless the
+    # run is followed by whitespace which int() would accept
+    def _scan_int(text, pos):
+        m = _int_run.match(text, pos)
+        if m is None:
+            return None
+
+        end = m.end()
+        if end == len(text):
+            return end
+
+        c = text[end]
+        if c != " " and c.isspace():
+            return None
+        return end
+
+    # fields with a terminator end on the last character before the first
+    # occurrence of the terminator is complete, which is right before the
+    # terminator if it is a single character. with a [ktype] which has a custom
+    # predicate, the field ends on the first prefix within that limit which
+    # satisfies the predicate of [ktype] while the next prefix does not; each 
+    # prefix is checked once. the predicate is looked up on each call, so 
+    # cached and profiled predicates apply
+    def _scan_ends_on(end, ktype=None):
+        def scan(text, pos):
+            i = text.find(end, pos)
+            limit = len(text) if i == -1 else i + len(end) - 1
+            if limit <= pos:
+                return None
+            if ktype is None:
+                return limit
+
+            predicate = ktype.predicate
+            valid = predicate(text[pos:pos+1])
+            for k in range(pos + 1, limit):
+                valid_next = predicate(text[pos:k+1])
+                if valid and not valid_next:
+                    return k
+                valid = valid_next
+
+            return limit if valid else None
+
+        return scan
+
+    # fields with a fixed size end after exactly [size] characters, provided
+    # the field matches once, as no other prefix has the right size
+    def _scan_size_eq(ktype, size):
+        def scan(text, pos):
+            end = pos + size
+            if end > len(text) or not ktype.matches(text[pos:end]):
+                return None
+            return end
+
+        return scan
+
+    # true if no string accepted by int() can contain [end], in which case
+    # terminating an int on [end] has no effect
+    def _int_cannot_contain(end):
+        for c in end:
+            if not (c.isdecimal() or c.isspace() or c in "+-_"):
+                return True
+        return False
+
+    # returns the scanner for a field of [ktype], or None if no scanner applies
+    def _compile_fragment(self, ktype):
+        if isinstance(ktype, _parser._skipped_field):
+            return _parser._scan_ends_on(ktype.end)
+
+        if not isinstance(ktype, (kint, kstr)):
+            return None
+
+        if ktype.size_eq is not None:
+            return _parser._scan_size_eq(ktype, ktype.size_eq)
+
+        if isinstance(ktype, kint):
+            if ktype.custom_predicate is not None:
+                return None
+            if ktype.ends_on is None or _parser._int_cannot_contain(ktype.ends_on):
+                return _parser._scan_int
+            return None
+
+        if ktype.ends_on:
+            return _parser._scan_ends_on(ktype.ends_on, ktype if ktype.custom_predicate is not None else None)
+
+        if ktype.ends_on is None and ktype.custom_predicate is None:
+            return _parser._scan_str
+
+        return None
+
+    # compiles [self.parse_fragments] into [self.parse_plan]
+    def _compile_parse_plan(self):
+        plan = []
+        for fragment in self.parse_fragments:
+            if isinstance(fragment, str):
+                plan.append(None)
+            else:
+                _, ktype = fragment
+                plan.append(self._compile_fragment(ktype))
+
+        self.parse_plan = plan
+
+    # returns a check which is True for the value of a field of [ktype] in a 
+    # delimited record if the greedy matcher ends the field exactly at the end
+    # of the value when it is followed by [end]. values never contain [end]
+    def _csv_check(ktype, end):
+        if isinstance(ktype, _parser._skipped_field) and ktype.end == end:
+            return bool
+
+        if (isinstance(ktype, kstr) and ktype.ends_on == end 
+                and ktype.custom_predicate is None and ktype.size_eq is None):
+            return bool
+
+        if (isinstance(ktype, kint) and ktype.custom_predicate is None and ktype.size_eq is None
+                and (ktype.ends_on is None or _parser._int_cannot_contain(ktype.ends_on))
+                and (end == " " or not end.isspace())):
+            return _csv_int.fullmatch
+
+        return lambda value: _parser._greedy_end(ktype, value + end) == len(value)
+
+    # returns the [self.csv_plan] of a parse format whose fields are separated
+    # by one single character delimiter, and whose records end on a newline,
+    # either as a trailing literal which is consumed or as the terminator of 
+    # the last field which is not. fields are given as (name, ktype, check), 
+    # with the check of '_csv_check', and order as the position in each line
+    # of the raw data of each attribute of [self.ktype], in the order of its
+    # keys, or None if the attributes are not each given once by the format.
+    # returns None for all other formats
+    def _compile_csv_plan(self):
+        fragments = self.parse_fragments
+        consumed = fragments[-1] == "\n"
+        if consumed:
+            fragments = fragments[:-1]
+
+        fields = fragments[0::2]
+        literals = fragments[1::2]
+        if not literals or len(fragments) % 2 == 0:
+            return None
+        if any(isinstance(field, str) for field in fields) or any(not isinstance(literal, str) for literal in literals):
+            return None
+
+        delimiter = literals[0]
+        if len(set(literals)) > 1 or len(delimiter) != 1 or delimiter in "\r\n":
+            return None
+
+        _, last = fields[-1]
+        if not consumed and (not isinstance(last, (kint, kstr)) or last.ends_on != "\n"):
+            return None
+
+        names = [name for name, _ in fields]
+        order = None
+        if len(set(names)) == len(names) and set(self.ktype.keys) <= set(names):
+            order = [names.index(key) for key in self.ktype.keys]
+
+        ends = [delimiter] * (len(fields) - 1) + ["\n"]
+        return delimiter, consumed, [(name, ktype, _parser._csv_check(ktype, end))
+            for (name, ktype), end in zip(fields, ends)], order
+
+    # returns the regular expression which matches a field of [ktype], or None if
+    # [ktype] has no regex form. predicate types only have a regex form when
+    # their predicate was built by 'where' from [size_eq] or [ends_on]
+    def _regex_for_fragment(self, ktype):
+        if isinstance(ktype, _parser._skipped_field):
+            end = re.escape(ktype.end)
+            return r"[^%s]+(?![^%s])" % (end, end)
+
+        if not isinstance(ktype, (kint, kstr)) or ktype.custom_predicate is not None:
+            return None
+
+        if ktype.size_eq is not None and ktype.ends_on is not None:
+            return None
+
+        size = ktype.size_eq
+        if size is not None and size < 1:
+            return None
+
+        if isinstance(ktype, kint):
+            if ktype.ends_on is not None:
+                return None
+            if size is None:
+                # int() also accepts trailing whitespace other than " ", which
+                # the regex leaves to the fragment matcher
+                return r"[+-]?\d+(?![\d]|[^\S ])"
+            if size == 1:
+                return r"\d"
+            return r"(?:[+-]\d{%d}|\d{%d})" % (size - 1, size)
+
+        if size is not None:
+            return r".{%d}" % size
+
+        if ktype.ends_on is None:
+            return r".+\Z"
+
+        if len(ktype.ends_on) == 1:
+            end = re.escape(ktype.ends_on)
+            return r"[^%s]+(?![^%s])" % (end, end)
+
+        return None
+
+    # a run of consecutive fragments which are matched by one compiled regular
+    # expression
+    class _regex_segment():
+        # instance attributes:
+        # [self.pattern] compiled regular expression anchored at the start of the
+        #       first fragment of the run
+        # [self.fields] <list> of (group, name, ktype) for each field in the run
+        # [self.last_index] index of the last fragment of the run
+        def __init__(self, pattern, fields, last_index):
+            self.pattern = pattern
+            self.fields = fields
+            self.last_index = last_index
+
+    # compiles every maximal run of fragments which have a regex form into a
+    # <_regex_segment>. fields without a regex form split runs, and are left to
+    # [self.parse_plan]
+    def _compile_parse_segments(self):
+        segments = [None] * len(self.parse_fragments)
+        start = 0
+        parts = []
+        fields = []
+
+        def close_segment(last_index):
+            if fields:
+                pattern = re.compile("".join(parts), re.DOTALL)
+                segments[start] = self._regex_segment(pattern, list(fields), last_index)
+            parts.clear()
+            fields.clear()
+
+        for i, fragment in enumerate(self.parse_fragments):
+            if isinstance(fragment, str):
+                if not parts:
+                    start = i
+                parts.append(re.escape(fragment))
+                continue
+
+            name, ktype = fragment
+            regex = self._regex_for_fragment(ktype)
+            if regex is None:
+                close_segment(i - 1)
+                continue
+
+            if not parts:
+                start = i
+            group = f"f{i}"
+            parts.append(f"(?P<{group}>{regex})")
+            fields.append((group, name, ktype))
+
+        close_segment(len(self.parse_fragments) - 1)
+        self.parse_segments = segments
+
+    # constructs a record of [self.ktype] from the [elements] matched by a 
+    # <_parse_context>
+    def construct_record(self, elements):
+        if _profile.enabled:
+            _profile.count("records")
+        if self.lazy:
+            return self.ktype.construct_lazy(elements)
+        return self.ktype.construct(elements)
+
+    # returns a new <_parse_context> for the parse format
+    def _new_context(self):
+        return self._parse_context(self.parse_fragments, self.parse_plan, self.parse_segments, self.lazy)
+
     class _parse_context():
-        def __init__(self, fragments):
+        # if [lazy], fields are not constructed; elements hold the raw data of
+        # each field as a (source, start, end) slice
+        def __init__(self, fragments, plan, segments=None, lazy=False):
             self.fragments = fragments
+            self.plan = plan
+            self.segments = segments
+            self.lazy = lazy
             self.clear()
 
         def clear(self):
@@ -60,6 +446,10 @@ class _parser():
             self.token = ""
             self.elements = {}
 
+        # returns True if no part of a record has been matched since 'clear'
+        def is_clear(self):
+            return not self.fragments_index and not self.position_in_fragment and not self.token
+
         def next_fragment(self):
             self.token = ""
             self.position_in_fragment = 0
@@ -91,10 +481,10 @@ class _parser():
                 name, ktype = self.current_fragment
                 self.token = self.token + c
                 if ktype.matches(self.token) and lookahead is None:
-                    self.elements[name] = ktype.construct(self.token)
+                    self.elements[name] = (self.token, 0, None) if self.lazy else ktype.construct(self.token)
                     has_next_fragmnet = self.next_fragment()
                 elif ktype.matches(self.token) and not ktype.matches(self.token + lookahead):
-                    self.elements[name] = ktype.construct(self.token)
+                    self.elements[name] = (self.token, 0, None) if self.lazy else ktype.construct(self.token)
                     has_next_fragmnet = self.next_fragment()
 
             if not has_next_fragmnet:
@@ -102,27 +492,765 @@ class _parser():
 
             return None
 
+        # consume [text] starting at [pos] until a record is completed or fails,
+        # or until [text] is exhausted. returns the result of matching (as for
+        # 'match') and the position after the last consumed character. literals
+        # and fields with a scanner are consumed in one step; all other fields
+        # and fields carried over from a previous call are matched by character
+        def feed(self, text, pos=0):
+            length = len(text)
+            while pos < length:
+                has_next_fragment = True
+                segment = None
+                if self.segments is not None and not self.token and not self.position_in_fragment:
+                    segment = self.segments[self.fragments_index]
+
+                # a segment which fails to match, possibly because the record
+                # continues in the next call, is matched fragment by fragment
+                m = None if segment is None else segment.pattern.match(text, pos)
+                if m is not None:
+                    for group, name, ktype in segment.fields:
+                        if self.lazy:
+                            self.elements[name] = (text, m.start(group), m.end(group))
+                        else:
+                            self.elements[name] = ktype.construct(m.group(group))
+                    pos = m.end()
+                    self.fragments_index = segment.last_index
+                    has_next_fragment = self.next_fragment()
+                elif self.fragment_is_str:
+                    fragment = self.current_fragment
+                    remaining = fragment[self.position_in_fragment:]
+                    chunk = text[pos:pos + len(remaining)]
+                    if not remaining.startswith(chunk):
+                        result = self.match(text[pos], None)
+                        pos = pos + 1
+                        if result is not None:
+                            return result, pos
+                        continue
+
+                    pos = pos + len(chunk)
+                    if len(chunk) < len(remaining):
+                        self.position_in_fragment = self.position_in_fragment + len(chunk)
+                        continue
+
+                    has_next_fragment = self.next_fragment()
+                else:
+                    scan = self.plan[self.fragments_index]
+                    end = None
+                    if scan is not None and not self.token:
+                        end = scan(text, pos)
+
+                    if end is None:
+                        lookahead = None if pos + 1 == length else text[pos+1]
+                        result = self.match(text[pos], lookahead)
+                        pos = pos + 1
+                        if result is not None:
+                            return result, pos
+                        continue
+
+                    name, ktype = self.current_fragment
+                    self.elements[name] = (text, pos, end) if self.lazy else ktype.construct(text[pos:end])
+                    pos = end
+                    has_next_fragment = self.next_fragment()
+
+                if not has_next_fragment:
+                    return {"result": True, "code": "success", "elements": self.elements}, pos
+
+            return None, pos
+
+        # as 'feed', for a record which must end at [limit], the end of the 
+        # record found by '_next_record'. only [text] up to [limit] is matched,
+        # so a record which runs past its delimiter fails without matching the
+        # rest of [text]
+        def feed_record(self, text, pos, limit):
+            result, end = self.feed(text[pos:limit])
+            if result is None:
+                result = {"result": False, "code": "record runs past its delimiter"}
+            return result, pos + end
+
+    # parses the records on the complete lines of [text] from [pos] with the
+    # <csv> reader, if the parser has a [self.csv_plan], and returns their
+    # tokens and the position after the last of them, where the next record
+    # starts. stops before the first line which is not a valid record, or on
+    # which a field would not end on the delimiter, which is left to the
+    # parse context, so the tokens are the same as those of 'feed'
+    def _parse_csv(self, text, pos):
+        delimiter, consumed, fields, order = self.csv_plan
+        tokens = []
+
+        # records of a compiled type are constructed by its parse function,
+        # except while profiling, which counts the work of each type
+        compiled = None
+        if order is not None and not self.lazy and not _profile.enabled:
+            compiled = self.ktype.compiled
+
+        # records which are not ended by a consumed newline start with the 
+        # newline of the previous record
+        start = pos
+        newline = ""
+        if not consumed and text.startswith("\n", pos):
+            start = pos + 1
+            newline = "\n"
+
+        end = text.rfind("\n", start)
+        if end == -1:
+            return tokens, pos
+
+        lines = text[start:end].split("\n")
+        reader = csv.reader(lines, delimiter=delimiter, quoting=csv.QUOTE_NONE)
+        try:
+            for line, row in zip(lines, reader):
+                # the reader drops a carriage return at the end of a line
+                if len(row) != len(fields) or line.endswith("\r"):
+                    break
+                row[0] = newline + row[0]
+                if not all(check(value) for (_, _, check), value in zip(fields, row)):
+                    break
+
+                if compiled is not None:
+                    token, err = compiled.parse([row[i] for i in order])
+                    if err is not None:
+                        break
+                    tokens.append(token)
+                elif self.lazy:
+                    elements = {name: (value, 0, None) for (name, _, _), value in zip(fields, row)}
+                    tokens.append(self.construct_record(elements))
+                else:
+                    elements = {name: ktype.construct(value) for (name, ktype, _), value in zip(fields, row)}
+                    tokens.append(self.construct_record(elements))
+
+                if consumed:
+                    pos = start + len(line) + 1
+                    start = pos
+                else:
+                    pos = start + len(line)
+                    start = pos + 1
+                    newline = "\n"
+        except csv.Error:
+            pass
+
+        return tokens, pos
+
     def parse_instance(self, instance):
-        context = self._parse_context(self.parse_fragments)
-        for i in range(len(instance)):
-            lookahead = None if i + 1 == len(instance) else instance[i+1]
-            result = context.match(instance[i], lookahead)
-            if result is not None:
-                return self.ktype.construct(result["elements"])
-
-    def parse_stream(self, stream, reset=False):
-        if reset or self.stream_context is None:
-            self.stream_context = self._parse_context(self.parse_fragments)
-            self.stream_tokens = []
-
-        for i in range(len(stream)):
-            lookahead = None if i + 1 == len(stream) else stream[i+1]
-            r = self.stream_context.match(stream[i], lookahead)
-            if r is not None:
+        if _profile.enabled:
+            _profile.count("characters", len(instance))
+        context = self._new_context()
+        result, _ = context.feed(instance)
+        if result is not None:
+            return self.construct_record(result["elements"])
+
+    # state of one stream parsed with 'parse_stream', or with 'new_stream' 
+    # explicitly, e.g. one for each thread. fields end at the end of each part of
+    # the stream given to 'parse'
+    class _stream():
+        # instance attributes:
+        # [self.parser] the <_parser> which parses the stream
+        # [self.context] the <_parse_context> of the stream
+        # [self.tokens] list or <_batch> of all tokens parsed from the stream
+        # [self.skipping] True if an invalid record is being skipped until the
+        #       record delimiter
+
+        def __init__(self, parser, columnar=False):
+            self.parser = parser
+            self.context = parser._new_context()
+            self.tokens = _batch(parser.ktype) if columnar else []
+            self.delimiter = parser._record_delimiter()
+            self.skipping = False
+
+        # parses all tokens in [stream], appends them to [self.tokens] which is
+        # returned. if [errors] is an <ErrorCollector>, invalid records are 
+        # taken by it and skipped up to the record delimiter, otherwise they are
+        # taken by the <ErrorHandler>
+        def parse(self, stream, errors=None):
+            if _profile.enabled:
+                _profile.count("characters", len(stream))
+
+            pos = 0
+            if self.skipping:
+                pos = _parser._next_record(stream, 0, self.delimiter, at_start=False)
+                if pos is None:
+                    return self.tokens
+                self.skipping = False
+
+            csv_lines = self.parser.csv_plan is not None
+            while pos < len(stream):
+                # records may have started in a previous part of the stream
+                started_here = self.context.is_clear()
+
+                # plain delimited records are parsed by the csv reader up to the
+                # first line it leaves to the parse context, and again after 
+                # that record if the csv reader parsed any records
+                if csv_lines and started_here:
+                    tokens, end = self.parser._parse_csv(stream, pos)
+                    for token in tokens:
+                        self.tokens.append(token)
+                    csv_lines = end > pos
+                    pos = end
+                    if pos == len(stream):
+                        break
+
+                start = pos if started_here else 0
+
+                # when errors are collected, a record which runs past the record
+                # delimiter is invalid, and only the stream up to the delimiter
+                # is matched
+                limit = None
+                if errors is not None and self.delimiter is not None:
+                    limit = _parser._next_record(stream, start, self.delimiter, at_start=started_here)
+                if limit is None:
+                    r, end = self.context.feed(stream, pos)
+                else:
+                    r, end = self.context.feed_record(stream, pos, limit)
+                if r is None:
+                    break
+
+                pos = end
                 if r["result"]:
-                    self.stream_tokens.append(self.ktype.construct(r["elements"]))
-                    self.stream_context.clear()
+                    self.tokens.append(self.parser.construct_record(r["elements"]))
+                elif errors is None:
+                    self.tokens.append(ErrorHandler.take(Error.OfParseFailure(r["code"])))
+                elif self.delimiter is None:
+                    errors.take_mismatch(self.parser.ktype, stream[start:pos])
+                else:
+                    end = limit
+                    if end is None:
+                        self.skipping = True
+                        end = len(stream)
+                    errors.take_mismatch(self.parser.ktype, stream[start:end])
+                    pos = end
+                self.context.clear()
+
+            return self.tokens
+
+    # returns a new stream with its own parse context and tokens, for parsing a
+    # stream independently of 'parse_stream' and of other streams
+    def new_stream(self, columnar=False):
+        return self._stream(self, columnar)
+
+    # parses all tokens in [stream] and appends them to the persistent list of
+    # stream tokens, which is returned. if [columnar] is given when the stream
+    # is started or [reset], tokens are stored in a columnar <_batch> instead.
+    # the persistent stream is shared by all threads; use 'new_stream' for 
+    # a stream per thread. invalid records are taken by [errors] if it is given
+    # (see 'ErrorCollector')
+    def parse_stream(self, stream, reset=False, columnar=False, errors=None):
+        with self.stream_lock:
+            if reset or self.stream is None:
+                self.stream = self._stream(self, columnar)
+
+            return self.stream.parse(stream, errors)
+
+    # yields the chunks of [source], which is either a file object read in chunks
+    # of [chunk_size], or an iterable of chunks
+    def _iter_chunks(source, chunk_size):
+        if hasattr(source, "read"):
+            return iter(lambda: source.read(chunk_size) or None, None)
+        return iter(source)
+
+    # state of parsing one stream of chunks, used by 'iter_stream' and 'aparse'.
+    # each stream has its own parse context. chunk boundaries do not end 
+    # fields: a record which is incomplete at the end of a chunk is carried 
+    # over and parsed again with the next chunk
+    class _chunked_stream():
+        # instance attributes:
+        # [self.parser] the <_parser> which parses the stream
+        # [self.context] the <_parse_context> of the stream
+        # [self.carry] <str> of the incomplete record at the end of the last chunk
+        # [self.decoder] incremental decoder for <bytes> chunks
+        # [self.batch] list or <_batch> of tokens not yet given out, if batching
+        # [self.count] number of tokens in [self.batch]
+        # [self.errors] <ErrorCollector> which takes invalid records, or None if
+        #       they are taken by the <ErrorHandler>
+        # [self.delimiter] the record delimiter, as given by '_record_delimiter'
+        # [self.ends_record] True if the end of the stream is the end of a 
+        #       record, as for the shards of 'parse_file', so when errors are
+        #       collected the last record is matched as if followed by the
+        #       record delimiter, and is invalid rather than dropped if it is
+        #       incomplete
+
+        def __init__(self, parser, batch_size, encoding, columnar, errors=None, ends_record=False):
+            self.parser = parser
+            self.context = parser._new_context()
+            self.batch_size = batch_size
+            self.columnar = columnar
+            self.carry = ""
+            self.decoder = codecs.getincrementaldecoder(encoding)()
+            self.batch = self._new_batch()
+            self.count = 0
+            self.errors = errors
+            self.delimiter = parser._record_delimiter()
+            self.ends_record = ends_record
+
+        def _new_batch(self):
+            return _batch(self.parser.ktype) if self.columnar else []
+
+        # parse [chunk], a <str> or <bytes>, and return a list of the tokens, or 
+        # full batches of tokens, which were completed
+        def push(self, chunk):
+            if not isinstance(chunk, str):
+                chunk = self.decoder.decode(chunk)
+            if _profile.enabled:
+                _profile.count("characters", len(chunk))
+            return self._parse(self.carry + chunk, final=False)
+
+        # parse what remains at the end of the stream and return a list of the
+        # last tokens or batches. an incomplete record is dropped
+        def finish(self):
+            out = self._parse(self.carry + self.decoder.decode(b"", final=True), final=True)
+            if self.count:
+                out.append(self.batch)
+                self.batch = self._new_batch()
+                self.count = 0
+            return out
+
+        # adds [token] to [out], or to the batch which is added to [out] once
+        # it is full
+        def _emit(self, out, token):
+            if self.batch_size is None:
+                out.append(token)
+                return
+
+            self.batch.append(token)
+            self.count = self.count + 1
+            if self.count == self.batch_size:
+                out.append(self.batch)
+                self.batch = self._new_batch()
+                self.count = 0
+
+        def _parse(self, text, final):
+            out = []
+            pos = 0
+            csv_lines = self.parser.csv_plan is not None
+            while pos < len(text):
+                # as in '_stream.parse'
+                if csv_lines:
+                    tokens, end = self.parser._parse_csv(text, pos)
+                    for token in tokens:
+                        self._emit(out, token)
+                    csv_lines = end > pos
+                    pos = end
+                    if pos == len(text):
+                        break
+
+                # as in '_stream.parse', a record which runs past the record
+                # delimiter is invalid when errors are collected
+                self.context.clear()
+                limit = None
+                if self.errors is not None and self.delimiter is not None:
+                    limit = _parser._next_record(text, pos, self.delimiter)
+                    if limit is None and final and self.ends_record:
+                        limit = len(text)
+                if limit is None:
+                    result, end = self.context.feed(text, pos)
+                else:
+                    result, end = self.context.feed_record(text, pos, limit)
+
+                # fields end at the end of the text, so a record which ends there
+                # may continue in the next chunk
+                if result is None or (end == len(text) and not final):
+                    break
+
+                if result["result"]:
+                    token = self.parser.construct_record(result["elements"])
+                elif self.errors is None:
+                    token = ErrorHandler.take(Error.OfParseFailure(result["code"]))
                 else:
-                    return result
+                    if self.delimiter is not None:
+                        end = limit
+                        if end is None:
+                            if not final:
+                                break
+                            end = len(text)
+                    self.errors.take_mismatch(self.parser.ktype, text[pos:end])
+                    pos = end
+                    continue
+                pos = end
+                self._emit(out, token)
+
+            self.carry = text[pos:]
+            return out
+
+    # parse tokens from [source], a file object or an iterable of <str>/<bytes>
+    # chunks, and yield each token as soon as its record completes, or lists of
+    # [batch_size] tokens if [batch_size] is given, as columnar <_batch> objects
+    # if [columnar] is True. <bytes> are decoded with [encoding]. unlike 
+    # 'parse_stream', chunk boundaries do not end fields (see '_chunked_stream'),
+    # so memory is bounded by [chunk_size] and the longest record. an
+    # incomplete record at the end of [source] is dropped. if [errors] is an 
+    # <ErrorCollector>, invalid records are taken by it and skipped up to the
+    # record delimiter (see '_next_record')
+    def iter_stream(self, source, chunk_size=1 << 20, batch_size=None, encoding="utf-8", columnar=False, errors=None):
+        stream = self._chunked_stream(self, batch_size, encoding, columnar, errors)
+        for chunk in _parser._iter_chunks(source, chunk_size):
+            yield from stream.push(chunk)
+        yield from stream.finish()
+
+    # asynchronous counterpart of 'iter_stream' which reads chunks of up to
+    # [chunk_size] from [reader], an <asyncio.StreamReader> or any object with
+    # an awaitable read(n) returning <bytes> or <str>, until it returns an 
+    # empty chunk. each call parses its own stream, so one parser can serve many
+    # connections on one event loop. the next chunk is only read once the 
+    # tokens of the last chunk have been consumed, so a slow consumer applies
+    # backpressure to the connection.
+    async def aparse(self, reader, chunk_size=1 << 16, batch_size=None, encoding="utf-8", columnar=False, errors=None):
+        stream = self._chunked_stream(self, batch_size, encoding, columnar, errors)
+        while True:
+            chunk = await reader.read(chunk_size)
+            if not chunk:
+                break
+            for token in stream.push(chunk):
+                yield token
+
+        for token in stream.finish():
+            yield token
+
+    # returns the delimiter which ends every record, and whether the delimiter
+    # is consumed by the record, or None if records have no such delimiter.
+    # this is either the trailing literal of the parse format, or the
+    # terminator of the last field
+    def _record_delimiter(self):
+        fragment = self.parse_fragments[-1]
+        if isinstance(fragment, str):
+            return fragment, True
+
+        _, ktype = fragment
+        if isinstance(ktype, (kint, kstr)) and ktype.ends_on:
+            return ktype.ends_on, False
+
+        return None
+
+    # returns the position in [text] after the end of the record which starts
+    # at [pos], found by searching for the [delimiter] given by 
+    # '_record_delimiter', or None if the end is not in [text]. if not [at_start],
+    # the record started before [pos]. used to skip invalid records, and to 
+    # bound the matching of records when errors are collected, so the delimiter
+    # must only occur at the end of records
+    def _next_record(text, pos, delimiter, at_start=True):
+        delimiter, consumed = delimiter
+        if consumed:
+            found = text.find(delimiter, pos)
+            return None if found == -1 else found + len(delimiter)
+
+        # records which are not ended by a consumed delimiter start with the
+        # last character of the delimiter of the previous record, as the last
+        # field ends on the character before it (see '_scan_ends_on')
+        found = text.find(delimiter, pos + 1 if at_start else pos)
+        return None if found == -1 else found + len(delimiter) - 1
+
+    # as '_next_record' for the bytes-like [data] of 'parse_bytes', which may not
+    # support find, where the delimiter is given by '_bytes_delimiter'
+    def _bytes_next_record(data, pos, delimiter):
+        pattern, consumed = delimiter
+        m = pattern.search(data, pos if consumed else pos + 1)
+        return None if m is None else m.end()
+
+    # returns the record delimiter of '_record_delimiter' for 'parse_bytes' as a
+    # compiled bytes pattern whose match ends where the record ends, and 
+    # whether the delimiter is consumed, or None if records have no delimiter
+    def _bytes_delimiter(self, encoding):
+        delimiter = self._record_delimiter()
+        if delimiter is None:
+            return None
+
+        delimiter, consumed = delimiter
+        if consumed:
+            return re.compile(re.escape(delimiter.encode(encoding))), True
+
+        head, last = delimiter[:-1].encode(encoding), delimiter[-1].encode(encoding)
+        return re.compile(re.escape(head) + b"(?=" + re.escape(last) + b")"), False
+
+    # returns the (start, end) byte offsets of at most [n] shards of [data] which
+    # each begin at the start of a record
+    def _shard_offsets(self, data, n, encoding):
+        delimiter = self._record_delimiter()
+        if delimiter is None or n < 2:
+            return [(0, len(data))]
+
+        delimiter, consumed = delimiter
+        last = delimiter[-1].encode(encoding)
+        delimiter = delimiter.encode(encoding)
+        boundaries = [0]
+        for i in range(1, n):
+            found = data.find(delimiter, max(boundaries[-1], i * len(data) // n))
+            if found == -1:
+                break
+            boundary = found + len(delimiter) if consumed else found + len(delimiter) - len(last)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(len(data))
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    # parses the bytes [start:end] of the file at [path] with [parser]. returns
+    # the tokens, and the <ErrorCollector> of the shard if errors are collected
+    # with [sample_size]. shards other than the last end where the next shard
+    # begins, which is the end of a record even if the record delimiter is not
+    # consumed and so is not part of the shard
+    def _parse_file_shard(parser, path, start, end, encoding, sample_size=None):
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                text = data[start:end].decode(encoding)
+                ends_record = end < len(data)
+
+        errors = None if sample_size is None else ErrorCollector(sample_size)
+        stream = parser._chunked_stream(parser, None, encoding, False, errors, ends_record)
+        return stream.push(text) + stream.finish(), errors
+
+    # as '_parse_file_shard' in a forked worker, with the parser stored under
+    # [key] in [forked_parsers]
+    def _parse_forked_shard(key, path, start, end, encoding, sample_size=None):
+        return _parser._parse_file_shard(_parser.forked_parsers[key], path, start, end, encoding, sample_size)
+
+    # parses all tokens in the file at [path] and returns them in order. with
+    # [workers] greater than 1, the file is split into shards at the record
+    # delimiter (see '_record_delimiter'), which must only occur at the end of
+    # records, and shards are parsed in forked worker processes. parsing is
+    # done in this process if records have no delimiter or 'fork' is not
+    # available on this platform. invalid records are taken by [errors] if it
+    # is given, as for 'iter_stream'
+    def parse_file(self, path, workers=1, encoding="utf-8", errors=None):
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                shards = self._shard_offsets(data, workers, encoding)
+
+        sample_size = None if errors is None else errors.sample_size
+        if len(shards) == 1 or "fork" not in multiprocessing.get_all_start_methods():
+            results = [_parser._parse_file_shard(self, path, start, end, encoding, sample_size)
+                for start, end in shards]
+        else:
+            key = next(_parser.forked_keys)
+            _parser.forked_parsers[key] = self
+            try:
+                context = multiprocessing.get_context("fork")
+                with concurrent.futures.ProcessPoolExecutor(len(shards), mp_context=context) as executor:
+                    results = list(executor.map(_parser._parse_forked_shard,
+                        *zip(*[(key, path, start, end, encoding, sample_size) for start, end in shards])))
+            finally:
+                del _parser.forked_parsers[key]
+
+        tokens = []
+        for result, shard_errors in results:
+            tokens.extend(result)
+            if errors is not None:
+                errors.merge(shard_errors)
+        return tokens
+
+    # returns the index at which the greedy, first-failure-stop matcher ends a 
+    # field of [ktype] at the start of [text], treating the end of [text] as
+    # the end of input, or None if the field does not end in [text]
+    def _greedy_end(ktype, text):
+        token = ""
+        for i, c in enumerate(text):
+            token = token + c
+            if ktype.matches(token):
+                if i + 1 == len(text) or not ktype.matches(token + text[i+1]):
+                    return i + 1
+        return None
+
+    # a bytes scanner takes the [data] being parsed and the [pos] at which a
+    # field starts, and returns the end of the field and the raw data to 
+    # construct it from, or None if the field does not end in [data]. as with
+    # the scanners of 'parse_plan', scanners agree exactly with the character
+    # matcher run over the decoded data
+
+    # returns a bytes scanner for fields of an unconstrained <kint>, which are
+    # the run of ascii digits that int() reads from bytes directly. fields which
+    # start or end next to whitespace or non-ascii data are left to [fallback]
+    def _bytes_scan_int(fallback):
+        def scan(data, pos):
+            m = _bytes_int_run.match(data, pos)
+            if m is None:
+                return fallback(data, pos)
+
+            end = m.end()
+            if end < len(data):
+                b = data[end]
+                if b >= 0x80 or (b != 0x20 and chr(b).isspace()):
+                    return fallback(data, pos)
+            return end, bytes(data[pos:end])
+
+        return scan
+
+    # returns a bytes scanner for fields of an unconstrained <kstr>, which 
+    # consume and decode the remaining data
+    def _bytes_scan_str(encoding):
+        def scan(data, pos):
+            return len(data), str(data[pos:], encoding)
+
+        return scan
+
+    # returns a bytes scanner for fields of <kstr> which end on [end]; only
+    # the field itself is decoded
+    def _bytes_scan_ends_on(end, ktype, encoding):
+        terminator = re.compile(re.escape(end.encode(encoding)))
+        last = len(end[-1].encode(encoding))
+        scan_text = _parser._scan_ends_on(end, ktype)
+
+        def scan(data, pos):
+            m = terminator.search(data, pos)
+            limit = len(data) if m is None else m.end() - last
+            if limit <= pos:
+                return None
+
+            text = str(data[pos:limit], encoding)
+            k = scan_text(text, 0)
+            if k is None:
+                return None
+            if k == len(text):
+                return limit, text
+            return pos + len(text[:k].encode(encoding)), text[:k]
+
+        return scan
+
+    # returns a bytes scanner for <_skipped_field> fields which end on [end]; 
+    # the field is not decoded
+    def _bytes_scan_skip(end, encoding):
+        terminator = re.compile(re.escape(end.encode(encoding)))
+
+        def scan(data, pos):
+            m = terminator.search(data, pos)
+            limit = len(data) if m is None else m.start()
+            if limit <= pos:
+                return None
+            return limit, None
+
+        return scan
+
+    # returns a bytes scanner for fields of any [ktype], which decodes a growing
+    # window of [data] and runs the character matcher over it
+    def _bytes_scan_greedy(ktype, encoding):
+        def scan(data, pos):
+            size = 256
+            while True:
+                complete = pos + size >= len(data)
+                decoder = codecs.getincrementaldecoder(encoding)()
+                text = decoder.decode(data[pos:pos+size], final=complete)
+                k = _parser._greedy_end(ktype, text)
+
+                # a field which ends at the end of the window may continue
+                # past it
+                if k is not None and (complete or k < len(text)):
+                    return pos + len(text[:k].encode(encoding)), text[:k]
+                if complete:
+                    return None
+                size = size * 2
+
+        return scan
+
+    # returns the plan used by 'parse_bytes' for [encoding]: encoded literals,
+    # and (name, ktype, scanner) for fields
+    def _bytes_plan(self, encoding):
+        plan = self.bytes_plans.get(encoding, None)
+        if plan is not None:
+            return plan
+
+        plan = []
+        for fragment in self.parse_fragments:
+            if isinstance(fragment, str):
+                plan.append(fragment.encode(encoding))
+                continue
+
+            name, ktype = fragment
+            scan = self._compile_fragment(ktype)
+            if isinstance(ktype, _parser._skipped_field):
+                scan = _parser._bytes_scan_skip(ktype.end, encoding)
+            elif scan is _parser._scan_int:
+                scan = _parser._bytes_scan_int(_parser._bytes_scan_greedy(ktype, encoding))
+            elif scan is _parser._scan_str:
+                scan = _parser._bytes_scan_str(encoding)
+            elif isinstance(ktype, kstr) and ktype.ends_on and ktype.size_eq is None:
+                predicated = ktype if ktype.custom_predicate is not None else None
+                scan = _parser._bytes_scan_ends_on(ktype.ends_on, predicated, encoding)
+            else:
+                scan = _parser._bytes_scan_greedy(ktype, encoding)
+            plan.append((name, ktype, scan))
+
+        self.bytes_plans[encoding] = plan
+        return plan
+
+    # returns the number of bytes the character matcher consumes from [pos] in
+    # [data] when failing to match the [literal]: the literal up to and
+    # including the first character which differs
+    def _bytes_to_mismatch(data, pos, literal, encoding):
+        literal = literal.decode(encoding)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        text = decoder.decode(data[pos:pos + 4 * len(literal) + 4], final=False)
+        for i, c in enumerate(text):
+            if i == len(literal) or c != literal[i]:
+                return len(text[:i+1].encode(encoding))
+        return len(text.encode(encoding)) or 1
+
+    # parses all tokens in [buffer], a <bytes>, <bytearray>, <memoryview> or 
+    # other bytes-like object, without decoding it as a whole. <kint> fields are
+    # read from the bytes directly and only other fields are decoded with
+    # [encoding]. tokens are the same as those given by 'iter_stream' over the
+    # decoded buffer; an incomplete record at the end of [buffer] is dropped.
+    # invalid records are taken by [errors] if it is given, as for 'iter_stream'
+    def parse_bytes(self, buffer, encoding="utf-8", errors=None):
+        data = buffer if isinstance(buffer, (bytes, bytearray)) else memoryview(buffer).cast("B")
+        if _profile.enabled:
+            _profile.count("characters", len(data))
+        plan = self._bytes_plan(encoding)
+        delimiter = self._bytes_delimiter(encoding)
+
+        tokens = []
+        pos = 0
+        while pos < len(data):
+            start = pos
+
+            # when errors are collected, only the data up to the end of the 
+            # record is scanned, so a record which runs past its delimiter fails
+            # without scanning the rest of [data]
+            limit = None
+            record = data
+            if errors is not None and delimiter is not None:
+                limit = _parser._bytes_next_record(data, start, delimiter)
+                if limit is not None:
+                    record = memoryview(data)[:limit]
+
+            elements = {}
+            for step in plan:
+                if isinstance(step, bytes):
+                    chunk = record[pos:pos+len(step)]
+                    if len(chunk) < len(step) and step.startswith(chunk):
+                        if limit is None:
+                            return tokens
+                        elements = None
+                        break
+                    if chunk != step:
+                        elements = None
+                        pos = pos + _parser._bytes_to_mismatch(record, pos, step, encoding)
+                        break
+                    pos = pos + len(step)
+                    continue
+
+                if pos == len(record):
+                    if limit is None:
+                        return tokens
+                    elements = None
+                    break
+
+                name, ktype, scan = step
+                scanned = scan(record, pos)
+                if scanned is None:
+                    # an incomplete record which contains the record delimiter
+                    # is invalid
+                    if limit is None:
+                        return tokens
+                    elements = None
+                    break
+                pos, raw_data = scanned
+                elements[name] = (raw_data, 0, None) if self.lazy else ktype.construct(raw_data)
+
+            if elements is not None:
+                tokens.append(self.construct_record(elements))
+            elif errors is None:
+                tokens.append(ErrorHandler.take(Error.OfParseFailure("failed to match text delimiter")))
+            else:
+                if delimiter is not None:
+                    pos = max(pos, len(data) if limit is None else limit)
+                errors.take_mismatch(self.ktype, bytes(data[start:pos]).decode(encoding, "replace"))
 
-        return self.stream_tokens
\ No newline at end of file
+        return tokens
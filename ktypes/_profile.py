@@ -0,0 +1,160 @@
+import collections
+import functools
+import time
+
+from ktypes._kint import kint
+from ktypes._kstr import kstr
+from ktypes._kor import kor
+from ktypes._kmeta import kmeta
+from ktypes._kfunc import _function_wrapper
+
+# opt-in counters of the work done by types, functions and parsers. when enabled,
+# the methods of each type are replaced by counting wrappers, and the predicates
+# of existing and new types by timing wrappers; when disabled the original
+# methods are restored, so nothing is counted and nothing is slowed down. counts
+# are kept for this process only, so work done by 'parse_file' workers is not
+# counted.
+#
+#   with types.profile() as profile:
+#       parser.parse_file("users.csv")
+#   print(profile.snapshot())
+class _profile():
+    # class attributes:
+    # [enabled] True while counting
+    # [methods] (class, method name, counter name) of each method which is
+    #       counted per type
+    # [counters] <dict> of the counters which are kept per type, by name. each
+    #       counter is a <dict> of counts by type
+    # [totals] <collections.Counter> of the counts which are not per type
+    # [originals] <list> of (class, method name, original method) to restore
+    # [timed] <list> of (type, timed predicate) for the types whose predicate
+    #       was replaced by a timed predicate
+
+    enabled = False
+    methods = [
+        (kint, "matches", "matches"),
+        (kstr, "matches", "matches"),
+        (kor, "matches", "matches"),
+        (kint, "construct", "construct"),
+        (kstr, "construct", "construct"),
+        (kor, "construct", "construct"),
+        (kmeta, "construct", "construct"),
+        (kmeta, "construct_lazy", "construct"),
+        (_function_wrapper, "_curry", "curry"),
+    ]
+    counters = {name: {} for name in ["matches", "construct", "curry", "predicate_calls", "predicate_time"]}
+    totals = collections.Counter()
+    originals = []
+    timed = []
+
+    # enter a block in which all work is counted, starting from zero
+    def __enter__(self):
+        _profile.reset()
+        _profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        _profile.disable()
+
+    # start counting, if not already counting
+    @classmethod
+    def enable(cls):
+        if cls.enabled:
+            return
+
+        for klass, name, counter in cls.methods:
+            method = klass.__dict__[name]
+            cls.originals.append((klass, name, method))
+            setattr(klass, name, cls._counted(method, counter))
+
+        # imported here as the universe registers new types with the profiler
+        from ktypes._kuniverse import kuniverse
+        for universe in list(kuniverse.universes.values()):
+            for ktype in list(universe.types.values()):
+                cls.instrument(ktype)
+
+        cls.enabled = True
+
+    # stop counting and restore all methods and predicates; counts are kept
+    @classmethod
+    def disable(cls):
+        if not cls.enabled:
+            return
+
+        cls.enabled = False
+        for klass, name, method in reversed(cls.originals):
+            setattr(klass, name, method)
+        cls.originals.clear()
+
+        # a predicate cached while counting caches the timed predicate, and is
+        # cached again around the original predicate
+        for ktype, timed in cls.timed:
+            if ktype.predicate is timed:
+                ktype.predicate = timed.profiled_predicate
+            elif ktype.predicate_cache is not None and ktype.predicate_cache.__wrapped__ is timed:
+                size = ktype.predicate_cache.cache_info().maxsize
+                ktype.predicate_cache = None
+                ktype.predicate = timed.profiled_predicate
+                ktype.cache_predicate(size)
+        cls.timed.clear()
+
+    # set all counts to zero
+    @classmethod
+    def reset(cls):
+        for counts in cls.counters.values():
+            counts.clear()
+        cls.totals.clear()
+
+    # returns a <dict> of the counts so far: "matches", "construct", "curry",
+    # "predicate_calls" and "predicate_time" are <dict> by type (by function
+    # type for "curry", in seconds for "predicate_time"), and "characters" and
+    # "records" are the totals parsed by all parsers
+    @classmethod
+    def snapshot(cls):
+        snapshot = {name: dict(counts) for name, counts in cls.counters.items()}
+        for total in ["characters", "records"]:
+            snapshot[total] = cls.totals[total]
+        return snapshot
+
+    # adds [count] to the total named [total]
+    @classmethod
+    def count(cls, total, count=1):
+        cls.totals[total] += count
+
+    # times the predicate of [ktype], if it has one, while counting
+    @classmethod
+    def instrument(cls, ktype):
+        if not ktype.has_predicate or hasattr(ktype.predicate, "profiled_predicate"):
+            return
+
+        ktype.predicate = cls._timed(ktype, ktype.predicate)
+        cls.timed.append((ktype, ktype.predicate))
+
+    # returns the [method] of a class which counts its calls per type under
+    # [counter]
+    def _counted(method, counter):
+        counts = _profile.counters[counter]
+
+        @functools.wraps(method)
+        def counted(self, *args, **kwargs):
+            key = self.ktype if counter == "curry" else self
+            counts[key] = counts.get(key, 0) + 1
+            return method(self, *args, **kwargs)
+
+        return counted
+
+    # returns [predicate] of [ktype] which counts and times its calls
+    def _timed(ktype, predicate):
+        calls = _profile.counters["predicate_calls"]
+        seconds = _profile.counters["predicate_time"]
+
+        def timed(raw_data):
+            start = time.perf_counter()
+            try:
+                return predicate(raw_data)
+            finally:
+                seconds[ktype] = seconds.get(ktype, 0.0) + time.perf_counter() - start
+                calls[ktype] = calls.get(ktype, 0) + 1
+
+        timed.profiled_predicate = predicate
+        return timed
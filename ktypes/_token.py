@@ -14,6 +14,10 @@ class _Token():
     # [self._is_meta] true if this token encodes a <kmeta> type
     # [self._is_func] true if this token encodes a <kfunc> type
     # [self._is_or] true if this token encodes a <kor> type
+    #
+    # tokens are created for every parsed field, so attributes are stored in
+    # slots rather than a per-instance __dict__
+    __slots__ = ("value", "type", "_is_meta", "_is_func", "_is_or")
 
     # construct a token with [value] for a given [ktype] 
     def __init__(self, value, ktype, is_func=False):
@@ -23,6 +27,11 @@ class _Token():
         self._is_func = is_func
         self._is_or = True if isinstance(value, tuple) else False
 
+    # tokens are pickled by reconstruction, as __getattr__ would otherwise be
+    # consulted before the instance attributes are restored
+    def __reduce__(self):
+        return (_Token, (self.value, self.type, self._is_func))
+
     # allow tokens which encode <kfunc> types to be callable. defers to the
     # stored function.
     def __call__(self, *args, **kwargs):
@@ -33,6 +42,8 @@ class _Token():
 
     # test for equality of tokens
     def __eq__(self, o):
+        if self is o:
+            return True
         if not isinstance(o, _Token):
             return False
         if o.type != self.type:
@@ -91,12 +102,18 @@ class _Token():
 
         return token_str + " : " + str(self.type)
 
-    # true if <self> is a token of [ktype]
+    # true if <self> is a token of [ktype]. tokens of a coproduct are also 
+    # tokens of any coproduct which has the type of their value as a member
     def is_a(self, ktype):
-        if self._is_or:
-            inj, val = self.value
-            return val.is_a(ktype.left) or val.is_a(ktype.right)
-        return self.type == ktype
+        if self.type is ktype:
+            return True
+        if not self._is_or:
+            return False
+
+        _, token = self.value
+        while token._is_or:
+            _, token = token.value
+        return token.type.id in ktype.member_ids
 
     # allow tokens which encode <kmeta> types to have attributes. defer to
     # the <kmeta> underlying dict for attribute values.
@@ -7,6 +7,9 @@ from ktypes._kfunc import (kfunc, _function_wrapper)
 from ktypes._kuniverse import kuniverse
 
 from ktypes._parser import _parser
+from ktypes._batch import _batch
+from ktypes._error import ErrorCollector
+from ktypes._profile import _profile
 
 from ktypes._abstract_type import KType
 from ktypes._metatype import MetaType
@@ -22,6 +25,9 @@ class types(metaclass=MetaType):
     # module public interface
     Token = _Token
     parser = _parser
+    Batch = _batch
+    ErrorCollector = ErrorCollector
+    profile = _profile
     universe = kuniverse(index=0)
             
 
@@ -0,0 +1,18 @@
+from benchmarks import benchmarks
+import argparse
+import sys
+
+parser = argparse.ArgumentParser(description="run the KTypes benchmarks")
+parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+parser.add_argument("--rows", type=int, default=10000, help="rows of generated data")
+parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is kept")
+parser.add_argument("--save", help="save results as a json baseline to this path")
+parser.add_argument("--compare", help="compare results with the json baseline at this path")
+parser.add_argument("--tolerance", type=float, default=0.2, help="allowed drop in throughput")
+args = parser.parse_args()
+
+results = benchmarks.run(args.rows, args.names, args.repeat)
+if args.save:
+    benchmarks.save(results, args.rows, args.save)
+if args.compare and benchmarks.compare(results, args.compare, args.tolerance):
+    sys.exit(1)
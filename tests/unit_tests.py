@@ -1,6 +1,13 @@
 from ktypes import types
 from ktypes._error import ErrorHandler, Error
+import asyncio
+import io
+import multiprocessing
+import os
+import pickle
 import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 tests = []
 
@@ -170,6 +177,42 @@ def inbuilt_predicates():
 
     expect(pred1).knot().to_be(pred2)
 
+@unit_test
+def cached_predicates():
+    "tests predicate results are cached when requested"
+    calls = []
+    def is_code(raw_data):
+        calls.append(raw_data)
+        return raw_data in ("US", "FR")
+
+    code = types.str.where(predicate=is_code, cache=2)
+    expect(code.matches("US")).to_be(True)
+    expect(code.matches("US")).to_be(True)
+    expect(code.matches("XX")).to_be(False)
+    expect(calls).to_equal(["US", "XX"])
+    expect(code.predicate_cache_info()).to_equal({"hits": 1, "misses": 2, "size": 2, "maxsize": 2})
+    expect(types.str.predicate_cache_info()).to_be(None)
+
+@unit_test
+def cached_predicates_in_parsers():
+    "tests parsers check terminated fields with the cached predicate of their type"
+    calls = []
+    def is_word(raw_data):
+        calls.append(raw_data)
+        return raw_data.isalpha()
+
+    word = types.str.where(ends_on=";", predicate=is_word, cache=16)
+    word_ktype = types.product({"a": word, "b": types.str.where(ends_on="\n")})
+    raw_data = "abc;1\n" * 50
+
+    parser = types.parser(word_ktype, "$a$;$b$\n")
+    matcher = types.parser(word_ktype, "$a$;$b$\n", csv=False)
+    expect(len(parser.parse_stream(raw_data))).to_be(50)
+    expect(len(matcher.new_stream().parse(raw_data))).to_be(50)
+    expect(len(parser.parse_bytes(raw_data.encode()))).to_be(50)
+    expect(calls).to_equal(["a", "ab", "abc", "abc;"])
+    expect(word.predicate_cache_info()["misses"]).to_be(4)
+
 @unit_test
 def multipe_predicates():
     "tests multiple predicates on a type"
@@ -205,6 +248,71 @@ def coproduct_type_ignores_order():
     prod4 = types.str.where(size_eq=5) | types.int.where(predicate=is_hello) | types.int
     expect(prod3).to_be(prod4)
 
+@unit_test
+def coproduct_membership():
+    "tests coproduct tokens are tokens of every coproduct with their value as a member"
+    five = types.str.where(size_eq=5)
+    inner = types.int | five
+    outer = inner | types.int.where(predicate=is_hello)
+    expect(outer.member_ids).to_equal(frozenset(t.id for t in [types.int, five, types.int.where(predicate=is_hello)]))
+
+    token = inner.construct("42")
+    expect(token.is_a(inner)).to_be(True)
+    expect(token.is_a(outer)).to_be(True)
+    expect(token.is_a(types.str | types.int.where(size_eq=7))).to_be(False)
+    expect(token.is_a(types.int)).to_be(False)
+    expect(types.int(42).is_a(outer)).to_be(False)
+
+    injected = outer.construct(token)
+    expect(injected.type).to_be(outer)
+    expect(injected.is_a(inner)).to_be(True)
+    expect(outer.construct(types.int(42))).to_equal(injected)
+    expect(outer.construct(types.str("hello there"))).is_instance(Error.OfTypeMismatch)
+
+@unit_test
+def coproduct_dispatch():
+    "tests coproducts only try members which may match the first character"
+    calls = []
+    def counted(raw_data):
+        calls.append(raw_data)
+        return True
+
+    coprod = types.int.where(predicate=counted) | types.str.where(size_eq=5) | types.str
+    expect(coprod("hello").value[1].value[1].value).to_be("hello")
+    expect(coprod("hello there").value[1].value).to_be("hello there")
+    expect(coprod.matches("a")).to_be(True)
+    expect(calls).to_equal([])
+
+    expect(coprod("12345").value[1].value[1].value).to_be(12345)
+    expect(calls).to_equal(["12345"])
+
+@unit_test
+def universe_lookups():
+    "tests function, product and coproduct types are found by their signature"
+    func1 = types.universe.get_function([types.int, types.str])
+    func2 = types.universe.get_function([types.int, types.str])
+    expect(func1).to_be(func2)
+    expect(func1).knot().to_be(types.universe.get_function([types.str, types.int]))
+
+    expect(types.universe.get_meta(f.type.signature)).to_be(product_ktype)
+    expect(types.universe.get_meta([types.str, types.str])).to_be(None)
+
+    coprod = types.int | types.str.where(size_eq=3)
+    expect(types.universe.get_or(types.str.where(size_eq=3), types.int)).to_be(coprod)
+
+    # a product defined again with the same spec replaces the first
+    @types.function
+    def g(a : types.str.where(size_eq=6), b : types.int) -> types.str:
+        return types.str(a.value + str(b.value))
+
+    spec = {"a": types.str.where(size_eq=6), "b": types.int}
+    first = types.product(spec)
+    second = types.product(spec)
+    expect(types.universe.get_meta(g.type.signature)).to_be(second)
+    token = second({"a": spec["a"]("abcdef"), "b": types.int(7)})
+    expect(types.ind_prod(g)(token)).to_equal(types.str("abcdef7"))
+    expect(first).knot().to_be(second)
+
 @unit_test
 def allow_named_types():
     "tests the syntax to define named types"
@@ -230,6 +338,20 @@ def curry_functions():
     expect(g(b, c)).to_equal(result)
     expect(g(b)(c)).to_equal(result)
 
+@unit_test
+def curry_function_types():
+    "tests curried functions share precomputed types and typecheck all arguments"
+    a = types.int(10)
+    b = types.int(200)
+    expect(f(a).type).to_be(types.universe.get_function([types.int, types.str, types.str]))
+    expect(f(a, b).type).to_be(f(a)(b).type)
+
+    try:
+        f(a, types.str("200"), types.str(" is the sum"))
+        expect(True).to_be(False)
+    except Error.OfTypeMismatch as err:
+        expect(err.expected).to_be(types.int)
+
 @unit_test
 def product_inductor():
     "tests inducing a function on product types"
@@ -259,6 +381,45 @@ def product_type():
         expect(product_ktype(bad_instance_dict)).is_instance(Error.OfTypeMismatch)
         expect(product_ktype([])).is_instance(Error.OfArgument)    
 
+@unit_test
+def construct_many_records():
+    "tests constructing many records in a pool returns tokens and compact failures"
+    records = [{"a": types.int(i), "b": types.int(i * 2), "c": types.str(str(i))} for i in range(100)]
+    records[7] = {"a": types.int(7), "b": types.str("14")}
+    records[42] = []
+    records[60] = {"a": 60, "b": 120, "c": "60"}
+
+    def check(tokens, failures):
+        expect(len(tokens)).to_be(97)
+        expect(tokens[7].a.value).to_be(8)
+        expect(tokens[0].type).to_be(product_ktype)
+        expect([i for i, _ in failures]).to_equal([7, 42, 60])
+        expect(failures[0][1]).is_instance(Error.OfTypeMismatch)
+        expect(failures[1][1]).is_instance(Error.OfArgument)
+        expect(failures[2][1]).is_instance(Error.OfTypeMismatch)
+
+    check(*product_ktype.construct_many(records, chunk_size=16))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        check(*product_ktype.construct_many(records, executor=executor, chunk_size=16))
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("fork")) as executor:
+            check(*product_ktype.construct_many(records, executor=executor, chunk_size=16))
+
+@unit_test
+def slotted_tokens():
+    "tests tokens store attributes in slots and still delegate product attributes"
+    token = types.int("100")
+    expect(hasattr(token, "__dict__")).to_be(False)
+
+    p = product_ktype({
+        "a": types.int(10),
+        "b": types.int(200),
+        "c": types.str(" is the sum")
+    })
+    expect(p.b.value).to_be(200)
+    expect(p.d).is_instance(Error.OfUndefinedAttribute)
+
 @unit_test
 def uncallable_types():
     "tests that basic types are uncallable"
@@ -288,6 +449,451 @@ def stream_parser():
     expect(result[0].c.value).to_be("hello there")
     expect(result[1].a.value).to_be(434)
 
+@unit_test
+def stream_parser_across_chunks():
+    "tests the stream parser carries partial records between calls"
+    parse_format = "$a$ $b$, $c$\n"
+    chunks = ["1245 43454", ", hello there\n434", " 44922, something word\n"]
+    whole = types.parser(bounded_product_ktype, parse_format).parse_stream("".join(chunks))
+
+    parser = types.parser(bounded_product_ktype, parse_format)
+    for chunk in chunks:
+        result = parser.parse_stream(chunk)
+    expect(len(result)).to_be(2)
+    expect(result[0]).to_equal(whole[0])
+    expect(result[1]).to_equal(whole[1])
+
+@unit_test
+def ends_on_parser():
+    "tests parsing fields which end on a terminator, with and without predicates"
+    ends_on_ktype = types.product({
+        "a": types.str.where(ends_on=";", predicate=contains_hello),
+        "b": types.int.where(ends_on=";"),
+        "c": types.str.where(ends_on="--"),
+    })
+    parser = types.parser(ends_on_ktype, "$a$;$b$;$c$-")
+    result = parser.parse_instance("say hello" + "!" * 1000 + ";42;last field--")
+    expect(result.a.value).to_be("say hello" + "!" * 1000)
+    expect(result.b.value).to_be(42)
+    expect(result.c.value).to_be("last field-")
+
+@unit_test
+def iter_stream_parser():
+    "tests the chunked stream parser is independent of chunk boundaries"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    parser = types.parser(bounded_product_ktype, parse_format)
+    result = list(parser.iter_stream(io.StringIO(raw_data), chunk_size=5))
+    expect(result).to_equal(expected)
+
+    chunks = [raw_data.encode()[i:i+3] for i in range(0, len(raw_data), 3)]
+    result = list(parser.iter_stream(chunks, batch_size=1))
+    expect(result).to_equal([[token] for token in expected])
+
+@unit_test
+def async_stream_parser():
+    "tests the asyncio parser gives the same tokens as the chunked stream parser"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+    parser = types.parser(bounded_product_ktype, parse_format)
+
+    async def parse_connections():
+        readers = [asyncio.StreamReader(), asyncio.StreamReader()]
+        for reader in readers:
+            reader.feed_data(raw_data.encode())
+            reader.feed_eof()
+
+        first = [token async for token in parser.aparse(readers[0], chunk_size=4)]
+        second = [batch async for batch in parser.aparse(readers[1], batch_size=1)]
+        return first, second
+
+    first, second = asyncio.run(parse_connections())
+    expect(first).to_equal(expected)
+    expect(second).to_equal([[token] for token in expected])
+
+@unit_test
+def parser_shared_between_threads():
+    "tests one parser and one schema can be used from many threads at once"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n" * 50
+    parser = types.parser(bounded_product_ktype, parse_format)
+    expected = parser.new_stream().parse(raw_data)
+
+    def parse(i):
+        stream = parser.new_stream()
+        for line in raw_data.splitlines(keepends=True):
+            tokens = stream.parse(line)
+        return tokens == expected and list(parser.iter_stream([raw_data], chunk_size=i + 1)) == expected
+
+    def define(i):
+        return types.int.where(size_eq=1000 + i % 4)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        expect(all(executor.map(parse, range(32)))).to_be(True)
+        defined = list(executor.map(define, range(32)))
+
+    for i, ktype in enumerate(defined):
+        expect(ktype is defined[i % 4]).to_be(True)
+
+@unit_test
+def collect_parse_errors():
+    "tests invalid records are skipped and collected when an error collector is given"
+    parse_format = "$a$ $b$, $c$\n"
+    good_data = "1245 43454, hello there\n434 44922, something word\n"
+    raw_data = "12 123, short\n1245 43454, hello there\nabc 12345, x\n434 44922, something word\n7 12345 no comma\n"
+    parser = types.parser(bounded_product_ktype, parse_format)
+    expected = parser.new_stream().parse(good_data)
+
+    for parse in [
+            lambda errors: list(parser.iter_stream([raw_data[:20], raw_data[20:]], errors=errors)),
+            lambda errors: parser.parse_bytes(raw_data.encode(), errors=errors),
+            lambda errors: parser.new_stream().parse(raw_data, errors=errors)]:
+        errors = types.ErrorCollector(sample_size=2)
+        expect(parse(errors)).to_equal(expected)
+        expect(errors.count).to_be(3)
+        expect(len(errors.samples)).to_be(2)
+        expect(errors.samples[0]).is_instance(Error.OfTypeMismatch)
+        expect(errors.samples[1].got).to_be("abc 12345, x\n")
+
+    result = parser.parse_stream("7 12345 no comma\n", reset=True)
+    expect(result[0]).is_instance(Error.OfParseFailure)
+
+@unit_test
+def collect_parse_errors_within_records():
+    "tests invalid records are matched no further than their record delimiter"
+    matched = []
+    def is_digits(x):
+        matched.append(x)
+        return x.isdigit()
+
+    digits_ktype = types.product({
+        "a": types.int,
+        "b": types.str.where(predicate=is_digits),
+        "c": types.str.where(ends_on="\n"),
+    })
+    parse_format = "$a$,$b$,$c$\n"
+    good_data = "".join(f"{i},{i},row {i}\n" for i in range(2000))
+    raw_data = "1,x,bad\n" + good_data
+    parser = types.parser(digits_ktype, parse_format)
+    expected = parser.new_stream().parse(good_data)
+
+    for parse in [
+            lambda errors: list(parser.iter_stream([raw_data], errors=errors)),
+            lambda errors: parser.parse_bytes(raw_data.encode(), errors=errors),
+            lambda errors: parser.new_stream().parse(raw_data, errors=errors)]:
+        matched.clear()
+        errors = types.ErrorCollector()
+        expect(parse(errors)).to_equal(expected)
+        expect(errors.count).to_be(1)
+        expect(errors.samples[0].got).to_be("1,x,bad\n")
+        expect(max(len(x) for x in matched) <= len("x,bad\n")).to_be(True)
+
+@unit_test
+def lazy_parser():
+    "tests lazy records construct each field on first access and equal eager records"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    parser = types.parser(bounded_product_ktype, parse_format, lazy=True)
+    result = list(parser.iter_stream([raw_data[:30], raw_data[30:]]))
+    expect(dict.__getitem__(result[0].value, "b")).is_instance(tuple)
+    expect(result[0].b.value).to_be(43454)
+    expect(dict.__getitem__(result[0].value, "b")).is_instance(types.Token)
+    expect(result).to_equal(expected)
+    expect(str(result[1])).to_equal(str(expected[1]))
+    expect(parser.parse_bytes(raw_data.encode())).to_equal(expected)
+    expect(pickle.loads(pickle.dumps(parser.parse_instance(raw_data)))).to_equal(expected[0])
+
+@unit_test
+def projected_parser():
+    "tests parsing only some fields returns tokens of the projected product type"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    projected_ktype = bounded_product_ktype.project(["c", "a"])
+    expect(bounded_product_ktype.project(["c", "a"])).to_be(projected_ktype)
+    same_signature_ktype = types.product({"x": bounded_product_ktype.dict["a"], "y": bounded_product_ktype.dict["c"]})
+    expect(bounded_product_ktype.project(["a", "c"])).knot().to_be(same_signature_ktype)
+    expect(any(t is same_signature_ktype for t in types.universe.types.values())).to_be(True)
+    expect(pickle.loads(pickle.dumps(same_signature_ktype))).to_be(same_signature_ktype)
+    for backend in types.parser.recognized_backends:
+        parser = types.parser(bounded_product_ktype, parse_format, backend=backend, fields=["c", "a"])
+        result = list(parser.iter_stream([raw_data[:30], raw_data[30:]]))
+        expect(result[0].type).to_be(projected_ktype)
+        expect([(r.a, r.c) for r in result]).to_equal([(r.a, r.c) for r in expected])
+        expect(result[1].b).is_instance(Error.OfUndefinedAttribute)
+        expect(parser.parse_bytes(raw_data.encode())).to_equal(result)
+
+@unit_test
+def profile_counters():
+    "tests profiling counts parsing work per type only while enabled"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    parser = types.parser(bounded_product_ktype, parse_format)
+    matches = types.int.matches
+
+    with types.profile() as profile:
+        parser.parse_instance(raw_data)
+        list(parser.iter_stream([raw_data]))
+        f(types.int(1), types.int(2), types.str("3"))
+        expect(types.int.matches).knot().to_be(matches)
+
+    snapshot = profile.snapshot()
+    expect(types.int.matches).to_be(matches)
+    expect(snapshot["records"]).to_be(3)
+    expect(snapshot["characters"]).to_be(2 * len(raw_data))
+    expect(snapshot["construct"][bounded_product_ktype]).to_be(3)
+    expect(snapshot["construct"][types.int] >= 3).to_be(True)
+    expect(snapshot["predicate_calls"][bounded_product_ktype.dict["b"]] > 0).to_be(True)
+    expect(snapshot["curry"][f.type]).to_be(1)
+
+    list(parser.iter_stream([raw_data]))
+    expect(types.profile.snapshot()).to_equal(snapshot)
+
+    terminated_ktype = types.product({
+        "a": types.str.where(ends_on=";", predicate=contains_hello),
+        "b": types.str.where(ends_on="\n"),
+    })
+    parser = types.parser(terminated_ktype, "$a$;$b$\n", csv=False)
+    for parse in [lambda: list(parser.iter_stream(["hello;1\n"])), lambda: parser.parse_bytes(b"hello;1\n")]:
+        with types.profile() as profile:
+            parse()
+        expect(profile.snapshot()["predicate_calls"].get(terminated_ktype.dict["a"], 0) > 0).to_be(True)
+
+    # a predicate cached while counting stays cached afterwards
+    calls = []
+    def is_short(raw_data):
+        calls.append(raw_data)
+        return len(raw_data) < 4
+
+    short = types.str.where(predicate=is_short)
+    with types.profile() as profile:
+        short.cache_predicate(size=8)
+        short.matches("abc")
+        short.matches("abc")
+    expect(profile.snapshot()["predicate_calls"][short]).to_be(1)
+    expect(short.predicate).to_be(short.predicate_cache)
+    expect(short.matches("abc")).to_be(True)
+    expect(short.matches("abc")).to_be(True)
+    expect(calls).to_equal(["abc", "abc"])
+    expect(short.predicate_cache_info()).to_equal({"hits": 1, "misses": 1, "size": 1, "maxsize": 8})
+
+@unit_test
+def csv_parser():
+    "tests plain delimited formats are parsed by the csv reader into the same tokens"
+    delimited_ktype = types.product({
+        "a": types.int,
+        "b": types.int | types.str.where(predicate=is_dash),
+        "c": types.str.where(ends_on="\n"),
+    })
+    parse_format = "$a$,$b$,$c$\n"
+    raw_data = "1,-,first\n2,17,second\n3,x,bad\n4,-,fourth\n"
+    parser = types.parser(delimited_ktype, parse_format)
+    expect(parser.csv_plan).knot().to_be(None)
+    expect(types.parser(bounded_product_ktype, "$a$ $b$, $c$\n").csv_plan).to_be(None)
+
+    matcher = types.parser(delimited_ktype, parse_format, csv=False)
+    for chunks in [[raw_data], [raw_data[:13], raw_data[13:]]]:
+        errors = types.ErrorCollector()
+        result = list(parser.iter_stream(chunks, errors=errors))
+        expect(result).to_equal(list(matcher.iter_stream(chunks, errors=types.ErrorCollector())))
+        expect([r.a.value for r in result]).to_equal([1, 2, 4])
+        expect(errors.count).to_be(1)
+    expect(parser.new_stream().parse(raw_data[:40])).to_equal(matcher.new_stream().parse(raw_data[:40]))
+
+@unit_test
+def compiled_product():
+    "tests compiled product types construct and parse the same tokens"
+    compiled_ktype = types.product({
+        "a": types.int,
+        "b": types.int | types.str.where(predicate=is_dash),
+        "c": types.str.where(ends_on="\n"),
+    })
+    parse_format = "$a$,$b$,$c$\n"
+    raw_data = "1,-,first\n2,17,second\n3,x,bad\n4,-,fourth\n"
+    parser = types.parser(compiled_ktype, parse_format)
+    expected = [r.value for r in parser.iter_stream([raw_data], errors=types.ErrorCollector())]
+    record = {"a": types.int(1), "b": compiled_ktype.dict["b"]("-"), "c": compiled_ktype.dict["c"]("first")}
+
+    expect(compiled_ktype.compile()).to_be(compiled_ktype)
+    compiled = compiled_ktype.compiled
+    expect(compiled_ktype.compile().compiled).to_be(compiled)
+    expect(compiled_ktype(record).value).to_equal(expected[0])
+    expect(compiled_ktype({"a": types.int(1)})).is_instance(Error.OfTypeMismatch)
+    expect(compiled_ktype({"a": 1, "b": "-", "c": "first"})).is_instance(Error.OfTypeMismatch)
+    expect(compiled.parse(["2", "17", "second"])[0].value).to_equal(expected[1])
+    expect(compiled.parse(["3", "x", "bad"])[1]).is_instance(Error.OfTypeMismatch)
+
+    errors = types.ErrorCollector()
+    result = list(parser.iter_stream([raw_data], errors=errors))
+    expect([r.value for r in result]).to_equal(expected)
+    expect(result[0].type).to_be(compiled_ktype)
+    expect(errors.count).to_be(1)
+
+@unit_test
+def bytes_parser():
+    "tests parsing bytes-like buffers gives the same tokens as parsing strings"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, héllo there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    parser = types.parser(bounded_product_ktype, parse_format)
+    expect(parser.parse_bytes(raw_data.encode())).to_equal(expected)
+    expect(parser.parse_bytes(memoryview(bytearray(raw_data.encode())))).to_equal(expected)
+    expect(parser.parse_bytes(raw_data.encode()[:-3])).to_equal(expected[:1])
+
+@unit_test
+def parse_file_in_workers():
+    "tests parsing a file in worker processes returns tokens in order"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "".join(f"{i} 4345{i % 10}, row {i}\n" for i in range(200))
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.txt")
+        with open(path, "w") as f:
+            f.write(raw_data)
+
+        parser = types.parser(bounded_product_ktype, parse_format)
+        expect(parser.parse_file(path, workers=3)).to_equal(expected)
+        expect(parser.parse_file(path)).to_equal(expected)
+
+        # one parser parses files from many threads at once
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: parser.parse_file(path), range(32)))
+        expect(all(result == expected for result in results)).to_be(True)
+
+        # records which end on a terminator of several characters, which is
+        # not consumed, are split between shards as by 'iter_stream'
+        terminated_ktype = types.product({"b": types.str.where(ends_on="ab")})
+        terminated_data = "".join(f"x{i}yab" for i in range(200))
+        with open(path, "w") as f:
+            f.write(terminated_data)
+
+        parser = types.parser(terminated_ktype, "$b$")
+        expected = list(parser.iter_stream([terminated_data]))
+        expect(parser.parse_file(path, workers=2)).to_equal(expected)
+        expect(parser.parse_file(path, workers=3)).to_equal(expected)
+
+        # an invalid record at the end of a shard is collected as by 'iter_stream'
+        raw_data = "".join(f"{i} 4345{i % 10}, row {i}\n" if i % 7 else f"{i} 4\n" for i in range(200))
+        with open(path, "w") as f:
+            f.write(raw_data)
+
+        parser = types.parser(bounded_product_ktype, parse_format)
+        for workers in [1, 2, 3, 5]:
+            errors = types.ErrorCollector()
+            expected_errors = types.ErrorCollector()
+            expected = list(parser.iter_stream([raw_data], errors=expected_errors))
+            expect(parser.parse_file(path, workers=workers, errors=errors)).to_equal(expected)
+            expect(errors.count).to_be(expected_errors.count)
+
+@unit_test
+def pickle_tokens():
+    "tests tokens and types are pickled by reference to the universe"
+    token = bounded_product_ktype({
+        "a": types.int(10),
+        "b": types.int.where(size_eq=5)("12345"),
+        "c": types.str.where(ends_on="\n")("hello"),
+    })
+    result = pickle.loads(pickle.dumps(token))
+    expect(result).to_equal(token)
+    expect(result.type).to_be(bounded_product_ktype)
+
+    # types registered under the same key are still pickled as themselves
+    same_signature_ktype = types.product(dict(bounded_product_ktype.dict))
+    expect(pickle.loads(pickle.dumps(token)).type).to_be(bounded_product_ktype)
+    expect(pickle.loads(pickle.dumps(same_signature_ktype))).to_be(same_signature_ktype)
+    three = types.universe.get_function([types.str.where(size_eq=3), types.int])
+    four = types.universe.get_function([types.str.where(size_eq=4), types.int])
+    expect(pickle.loads(pickle.dumps(three))).to_be(three)
+    expect(pickle.loads(pickle.dumps(four))).to_be(four)
+
+@unit_test
+def columnar_stream_parser():
+    "tests the stream parser can store tokens in a columnar batch"
+    coproduct_ktype = types.product({
+        "a": types.int,
+        "b": types.int | types.str.where(predicate=is_dash),
+        "c": types.str.where(ends_on="\n"),
+    })
+    parse_format = "$a$,$b$,$c$\n"
+    raw_data = "1,-,first\n2,17,second\n3,-,third\n"
+    expected = types.parser(coproduct_ktype, parse_format).parse_stream(raw_data)
+
+    parser = types.parser(coproduct_ktype, parse_format)
+    result = parser.parse_stream(raw_data, columnar=True)
+    expect(result).is_instance(types.Batch)
+    expect(len(result)).to_be(3)
+    expect(list(result)).to_equal(expected)
+    expect(result[-1]).to_equal(expected[2])
+    expect(list(result.column("a").values)).to_equal([1, 2, 3])
+    expect(list(result.column("b").tags)).to_equal([1, 0, 1])
+    expect(result.column("c")[1]).to_equal(expected[1].c)
+
+@unit_test
+def map_function_over_batch():
+    "tests applying a function to the columns and rows of a batch"
+    @types.function
+    def scale(x : types.int, y : types.int) -> types.int:
+        return x * types.int(3) + y
+
+    batch = types.Batch(product_ktype)
+    for a, b, c in [(1, 2, "x"), (3, 4, "y"), (5, 6, "z")]:
+        batch.append(product_ktype({"a": types.int(a), "b": types.int(b), "c": types.str(c)}))
+    expected = [types.int(5), types.int(13), types.int(21)]
+
+    expect(list(scale.map_batch(batch.column("a"), batch.column("b")))).to_equal(expected)
+    vectorized = scale.map_batch(batch.column("a"), batch.column("b"), vectorize=True)
+    expect(list(vectorized)).to_equal(expected)
+    expect(list(scale(types.int(1)).map_batch(batch.column("b")))).to_equal(
+        [types.int(5), types.int(7), types.int(9)])
+
+    f_prod = types.ind_prod(f)
+    expect(f_prod.map_batch(batch)[1]).to_equal(types.str("7y"))
+    expect(scale.map_batch(batch.column("a"))).is_instance(Error.OfArgument)
+
+@unit_test
+def regex_parser_backend():
+    "tests the regex parser backend produces the same tokens as the default parser"
+    parse_format = "$a$ $b$, $c$\n"
+    raw_data = "1245 43454, hello there\n434 44922, something word\n"
+    expected = types.parser(bounded_product_ktype, parse_format).parse_stream(raw_data)
+
+    parser = types.parser(bounded_product_ktype, parse_format, backend="regex")
+    result = parser.parse_stream(raw_data)
+    expect(len(result)).to_be(2)
+    expect(result[0]).to_equal(expected[0])
+    expect(result[1]).to_equal(expected[1])
+
+    coproduct_ktype = types.product({
+        "a": types.int,
+        "b": types.int | types.str.where(predicate=is_dash),
+    })
+    parser = types.parser(coproduct_ktype, "$a$,$b$\n", backend="regex")
+    result = parser.parse_instance("12,-\n")
+    expect(result.a.value).to_be(12)
+    expect(str(result.b)).to_be("inr(- : str*) : int | str*")
+
+@unit_test
+def interned_tokens():
+    "tests interned types share one token per value up to the table size"
+    status = types.int.where(predicate=lambda x: len(x) == 3).intern_tokens(size=2)
+    expect(status("200")).to_be(status("200"))
+    expect(status("200") is status("200")).to_be(True)
+    status("404")
+    expect(status("500") is status("500")).to_be(False)
+    expect(status("500")).to_equal(status("500"))
+
+    status.intern_tokens(None)
+    expect(status("200") is status("200")).to_be(False)
+    expect(types.int("200") is types.int("200")).to_be(False)
+
 @unit_test
 def token_equality():
     "tests proper equality behavior on token objects"
@@ -362,6 +968,9 @@ def coproducts_on_functions():
         t3 = coprod("4403")
         expect(coprod_func(t3)).to_be(types.str("-4403"))
 
+        dispatch = coprod_func.value.func.dispatch
+        expect(sorted(func.func.__name__ for func, _ in dispatch.values())).to_equal(["f", "g", "h"])
+
 @context
 def basic_ops():
     int1 = types.int(10)